@@ -10,6 +10,7 @@ from quart import Quart
 from flask_babel import Babel
 from asyncio import run
 from quart_auth import AuthManager
+from jinja2 import FileSystemBytecodeCache
 from .gino_quart import Gino
 from .config import config
 from logging import getLogger
@@ -21,12 +22,51 @@ app.version = __version__
 app.license = __license__
 
 app.config.from_object(config)
+
+# Compiled templates are shared by all workers (see toolkit.py compile-templates)
+# Has to be set before anything (e.g. Babel) creates app.jinja_env
+app.jinja_options = dict(
+    app.jinja_options,
+    bytecode_cache=FileSystemBytecodeCache(app.config.get("TEMPLATE_CACHE_DIR")),
+)
+
 app.log = getLogger("Boardgame-Backend")
 app.babel = Babel(app)
 db = Gino(app=app, dsn=app.config.get("DATABASE_URL"))
 app.auth = AuthManager(app)
 app.secret_key = app.config.get("SECRET")
 
+# Pool for password hashing (keeps PBKDF2 off the event loop)
+from .hashing import HashPool
+
+app.hash_pool = HashPool(app)
+
+# Cache for rendered pages (see routes decorated with app.page_cache.cached)
+from .pagecache import PageCache
+
+app.page_cache = PageCache(app)
+app.page_cache.register_version("translations", lambda: app.translations.revision)
+
+# Fingerprinted static files (see toolkit.py build-assets)
+from .assets import Assets
+
+app.assets = Assets(app)
+
+# Prometheus metrics at /metrics
+from .metrics import Metrics
+
+app.metrics = Metrics(app, db)
+
+# Slow query log, only active with SLOW_QUERY_MS set
+from .slowlog import SlowQueryLog
+
+app.slow_queries = SlowQueryLog(app, db)
+
+# iCalendar feeds of rooms with cached events
+from .ical import CalendarFeeds
+
+app.calendars = CalendarFeeds(app)
+
 # Load models
 from .models import *
 
@@ -40,11 +80,34 @@ from .auth import *
 from .filters import *
 
 # Load translation unit cache
-from .helper import TranslationCache
+from .helper import Listener, TranslationCache, RoleCache, warm_templates
 
+app.listener = Listener(app)
 app.translations = TranslationCache(app)
+app.roles = RoleCache(app)
+
+# Per worker index of upcoming reservations
+from .booking import ReservationIndex
+
+app.reservations = ReservationIndex(app)
 
 # before serving
 @app.before_serving
 async def refresh():
+    if app.config.get("TEMPLATE_WARMUP"):
+        warm_templates(app)
     await app.translations.refresh()
+    app.translations.start()
+    if app.config.get("TRANSLATION_CACHE_LISTEN"):
+        app.translations.listen(app.listener)
+    if app.config.get("ROLE_CACHE_LISTEN"):
+        app.roles.listen(app.listener)
+    if app.config.get("PAGE_CACHE_LISTEN"):
+        app.page_cache.listen(app.listener, "rooms", "rooms")
+    await app.listener.start()
+
+
+@app.after_serving
+async def unlisten():
+    await app.listener.stop()
+    await app.translations.stop()
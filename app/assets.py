@@ -0,0 +1,112 @@
+__doc__ = """
+Fingerprinted, precompressed static assets.
+
+``toolkit.py build-assets`` mirrors ``app/static`` into ``app/static/build``
+with content hashed copies (``css/style.<hash>.css``), ``.gz``/ ``.br``
+variants and a ``manifest.json``. At runtime :class:`Assets` rewrites
+``url_for("static", filename=...)`` through the manifest and serves hashed
+files precompressed with ``Cache-Control: immutable``.
+"""
+
+import gzip
+import typing
+from hashlib import sha256
+from mimetypes import guess_type
+from os import path, walk, makedirs
+from shutil import copyfile
+from ujson import load, dump
+from quart import Quart, request, send_file
+
+try:
+    import brotli
+except ImportError:  # Optional, only .gz variants are built without it
+    brotli = None
+
+BUILD_DIR = "build"
+MANIFEST = "manifest.json"
+COMPRESSIBLE = (".css", ".js", ".map", ".svg", ".json", ".webmanifest", ".xml")
+COMPRESSIBLE += (".ico", ".ttf", ".eot", ".txt")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def build_assets(static_folder: str) -> typing.Dict[str, str]:
+    """Writes hashed and precompressed copies of all static files
+
+    Unhashed copies are written as well, so relative references inside
+    assets (source maps, fonts in css) keep working.
+
+    Args:
+        static_folder (str): path of app/static
+
+    Returns:
+        typing.Dict[str, str]: manifest (original filename -> hashed filename)
+    """
+    build_folder, manifest = path.join(static_folder, BUILD_DIR), dict()
+
+    for root, subdirs, files in walk(static_folder):
+        if path.commonpath([root, build_folder]) == build_folder:
+            continue
+        for filename in files:
+            source = path.join(root, filename)
+            name = path.relpath(source, static_folder).replace(path.sep, "/")
+            with open(source, "rb") as f:
+                content = f.read()
+
+            stem, ext = path.splitext(name)
+            hashed = f"{stem}.{sha256(content).hexdigest()[:12]}{ext}"
+            makedirs(path.dirname(path.join(build_folder, hashed)), exist_ok=True)
+            copyfile(source, path.join(build_folder, name))
+            with open(path.join(build_folder, hashed), "wb") as f:
+                f.write(content)
+
+            if ext in COMPRESSIBLE:
+                with open(path.join(build_folder, hashed + ".gz"), "wb") as f:
+                    f.write(gzip.compress(content, compresslevel=9))
+                if brotli is not None:
+                    with open(path.join(build_folder, hashed + ".br"), "wb") as f:
+                        f.write(brotli.compress(content))
+            manifest[name] = f"{BUILD_DIR}/{hashed}"
+
+    with open(path.join(build_folder, MANIFEST), "w") as f:
+        dump(manifest, f, indent=2)
+    return manifest
+
+
+class Assets:
+    """Resolves static urls through the build manifest and serves hashed files"""
+
+    def __init__(self, app: Quart):
+        self.app, self.manifest = app, dict()
+        manifest = path.join(app.static_folder, BUILD_DIR, MANIFEST)
+        if path.isfile(manifest):
+            with open(manifest, "r") as f:
+                self.manifest = load(f)
+        self.hashed = set(self.manifest.values())
+
+        @app.url_defaults
+        def fingerprint_static(endpoint: str, values: dict):
+            if endpoint == "static" and "filename" in values:
+                values["filename"] = self.manifest.get(
+                    values["filename"], values["filename"]
+                )
+
+        app.view_functions["static"] = self.send_static_file
+
+    async def send_static_file(self, filename: str):
+        if filename not in self.hashed:
+            return await self.app.send_static_file(filename)
+
+        source = path.join(self.app.static_folder, filename)
+        accepted = request.headers.get("Accept-Encoding", "")
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding in accepted and path.isfile(source + suffix):
+                response = await send_file(
+                    source + suffix, mimetype=guess_type(filename)[0]
+                )
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = await send_file(source)
+        response.headers["Cache-Control"] = IMMUTABLE
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
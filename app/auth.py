@@ -1,7 +1,35 @@
-from . import app
-from quart import redirect, url_for, ResponseReturnValue, request, render_template
-from quart_auth import Unauthorized, login_user, logout_user
-from .models import User
+from . import app, db
+from quart import (
+    redirect,
+    url_for,
+    ResponseReturnValue,
+    request,
+    render_template,
+    abort,
+)
+from quart_auth import Unauthorized, AuthUser, login_user, logout_user
+from .hashing import PoolSaturated
+from .models import User, ApiToken
+
+
+@app.before_request
+async def authenticate_api_token():
+    """Sets ``request.api_user`` from an ``Authorization: Bearer <token>`` header
+
+    Requests without the header get None, invalid, expired or revoked tokens
+    and suspended users are rejected with 401.
+    """
+    request.api_user = None
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    # Revoked tokens are deleted, a lagging replica would still accept them
+    with db.use_primary():
+        user = await ApiToken.authenticate(token.strip())
+    if user is None or not user.is_authenticated:
+        return "", 401, {"WWW-Authenticate": 'Bearer error="invalid_token"'}
+    request.api_user = user
+    return None
 
 
 @app.route("/user/login", methods=["GET", "POST"])
@@ -9,29 +37,34 @@ async def login():
     if request.method == "GET":
         return await render_template("auth/login.html")
     else:
-        username = request.values.get("username", None)
-        password = reqest.values.get("password", None)
+        values = await request.values
+        username = values.get("username", None)
+        password = values.get("password", None)
         if username is None or password is None:
             abort(401)
         else:
-            user = User.get_by_username(username)
-            if user.verify_password(password):
-                login_user(user)
+            user = await User.get_by_username(username)
+            if user is not None and await user.verify_password_async(password):
+                login_user(AuthUser(str(user.id)))
+                return redirect("/")
             else:
                 abort(403)
 
 
 @app.route("/user/logout")
+@db.no_connection
 async def logout():
     return redirect("/")
 
 
 @app.route("/user/profile")
+@db.no_connection
 async def user_profile():
     return redirect("/")
 
 
 @app.route("/user/forgot-password", methods=["GET", "POST"])
+@db.no_connection
 async def forgot_password():
     return redirect("/")
 
@@ -39,3 +72,8 @@ async def forgot_password():
 @app.errorhandler(Unauthorized)
 async def redirect_to_login(*_: Exception) -> ResponseReturnValue:
     return redirect(url_for("login"))
+
+
+@app.errorhandler(PoolSaturated)
+async def hash_pool_saturated(*_: Exception) -> ResponseReturnValue:
+    return "", 503, {"Retry-After": "1"}
@@ -0,0 +1,226 @@
+__doc__ = """
+Reservation booking with overlap protection.
+
+The database is authoritative: ``reservations`` carries a GiST exclusion
+constraint on ``(room_id, tsrange(start, "end"))`` (see migration
+``3b7d0e5c2a91``). Every worker additionally keeps a per room interval index
+of upcoming reservations, so obvious conflicts are rejected without a round
+trip and free slots are checked in O(log n).
+"""
+
+import typing
+from bisect import bisect_left
+from datetime import datetime
+from time import monotonic
+from ujson import dumps
+from asyncpg.exceptions import ExclusionViolationError
+from quart import Quart
+from . import db
+
+BOOK_QUERY = db.text("""
+    WITH conflict AS (
+        SELECT id, start, "end" FROM reservations
+        WHERE room_id = :room_id
+        AND tsrange(start, "end") && tsrange(CAST(:start AS timestamp), CAST(:end AS timestamp))
+        LIMIT 1
+    ), inserted AS (
+        INSERT INTO reservations (room_id, user_id, is_public, meta, start, "end")
+        SELECT :room_id, :user_id, :is_public, CAST(:meta AS jsonb), :start, :end
+        WHERE NOT EXISTS (SELECT 1 FROM conflict)
+        RETURNING id
+    )
+    SELECT inserted.id AS id, conflict.id AS conflict_id,
+        conflict.start AS conflict_start, conflict."end" AS conflict_end
+    FROM (SELECT 1) AS one
+    LEFT JOIN inserted ON true
+    LEFT JOIN conflict ON true
+    """)
+# Attempts of BOOK_QUERY when concurrent bookings keep winning the race
+BOOK_ATTEMPTS = 3
+
+
+class ReservationConflict(Exception):
+    """Raised when a booking overlaps an existing reservation of the same room"""
+
+    def __init__(
+        self, room_id: int, id: typing.Optional[int], start: datetime, end: datetime
+    ):
+        self.room_id, self.id, self.start, self.end = room_id, id, start, end
+        message = f"Room {room_id} is already reserved from {start} to {end}"
+        # id is None if concurrent bookings kept winning (see BOOK_ATTEMPTS)
+        if id is not None:
+            message += f" (reservation {id})"
+        super().__init__(message)
+
+
+class RoomIntervalIndex:
+    """Sorted, non overlapping ``[start, end)`` intervals of a single room
+
+    Reservations of one room never overlap, so sorting by start also sorts by
+    end and any overlap query only has to look at a single neighbour.
+    """
+
+    def __init__(self, horizon: datetime):
+        self.horizon, self.loaded = horizon, monotonic()
+        self.starts, self.ends, self.ids = [], [], []
+
+    def conflict(self, start: datetime, end: datetime) -> typing.Optional[int]:
+        """Returns the position of an interval overlapping ``[start, end)`` or None"""
+        pos = bisect_left(self.starts, end) - 1
+        if pos >= 0 and self.ends[pos] > start:
+            return pos
+        return None
+
+    def add(self, id: int, start: datetime, end: datetime) -> None:
+        # Conflicts reported by the database may already be indexed
+        if id in self.ids:
+            return
+        pos = bisect_left(self.starts, start)
+        self.starts.insert(pos, start)
+        self.ends.insert(pos, end)
+        self.ids.insert(pos, id)
+
+    def discard(self, id: int) -> None:
+        if id in self.ids:
+            pos = self.ids.index(id)
+            del self.starts[pos], self.ends[pos], self.ids[pos]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class ReservationIndex:
+    """Per worker cache of upcoming reservations, keyed by room id
+
+    Entries are loaded lazily per room and reloaded after
+    ``RESERVATION_INDEX_TTL`` seconds, which bounds how long a reservation
+    cancelled by another worker can shadow a free slot.
+    """
+
+    def __init__(self, app: Quart):
+        self.app, self.rooms = app, dict()
+        self.ttl = float(app.config.get("RESERVATION_INDEX_TTL", 60))
+
+    async def get_room(self, room_id: int) -> RoomIntervalIndex:
+        """Returns (and loads if missing or expired) the interval index of a room"""
+        from .models import Reservation
+
+        index = self.rooms.get(room_id, None)
+        if index is None or monotonic() - index.loaded > self.ttl:
+            index = RoomIntervalIndex(datetime.utcnow())
+            reservations = await Reservation.get_upcoming_query.all(
+                room_id=room_id, horizon=index.horizon
+            )
+            for reservation in reservations:
+                index.add(reservation.id, reservation.start, reservation.end)
+            self.rooms[room_id] = index
+        return index
+
+    async def conflict(
+        self, room_id: int, start: datetime, end: datetime
+    ) -> typing.Optional[ReservationConflict]:
+        """Checks ``[start, end)`` against the cached reservations of a room
+
+        Returns:
+            typing.Optional[ReservationConflict]: conflict or None if the slot
+            looks free (or lies before the cached horizon)
+        """
+        index = await self.get_room(room_id)
+        if start < index.horizon:
+            return None
+        pos = index.conflict(start, end)
+        if pos is None:
+            return None
+        return ReservationConflict(
+            room_id, index.ids[pos], index.starts[pos], index.ends[pos]
+        )
+
+    def add(self, room_id: int, id: int, start: datetime, end: datetime) -> None:
+        index = self.rooms.get(room_id, None)
+        if index is not None and end > index.horizon:
+            index.add(id, start, end)
+
+    def discard(self, room_id: int, id: int) -> None:
+        index = self.rooms.get(room_id, None)
+        if index is not None:
+            index.discard(id)
+
+    async def book(
+        self,
+        room_id: int,
+        user_id: int,
+        start: datetime,
+        end: datetime,
+        is_public: bool = False,
+        meta: typing.Optional[dict] = None,
+    ):
+        """Books a room in a single indexed round trip
+
+        Args:
+            room_id (int): id of reserved room
+            user_id (int): id of reserving user
+            start (datetime): start of reservation (inclusive)
+            end (datetime): end of reservation (exclusive)
+            is_public (bool, optional): Show reservation in events. Defaults to False.
+            meta (typing.Optional[dict], optional): Additional data. Defaults to None.
+
+        Raises:
+            ValueError: if end is not after start
+            ReservationConflict: if the slot overlaps an existing reservation
+
+        Returns:
+            Reservation: the created reservation
+        """
+        from .models import Reservation
+
+        if end <= start:
+            raise ValueError("Reservation has to end after it starts")
+
+        conflict = await self.conflict(room_id, start, end)
+        if conflict is not None:
+            raise conflict
+
+        params = dict(
+            room_id=room_id,
+            user_id=user_id,
+            is_public=is_public,
+            meta=dumps(meta) if meta is not None else None,
+            start=start,
+            end=end,
+        )
+        for _ in range(BOOK_ATTEMPTS):
+            try:
+                # Savepoint if the caller is in a transaction, a failed attempt
+                # must not abort it
+                async with db.transaction():
+                    row = await db.first(BOOK_QUERY, **params)
+                break
+            except ExclusionViolationError:
+                # A concurrent booking committed between snapshot and insert
+                continue
+        else:
+            raise ReservationConflict(room_id, None, start, end)
+
+        if row["conflict_id"] is not None:
+            self.add(
+                room_id, row["conflict_id"], row["conflict_start"], row["conflict_end"]
+            )
+            raise ReservationConflict(
+                room_id, row["conflict_id"], row["conflict_start"], row["conflict_end"]
+            )
+
+        self.add(room_id, row["id"], start, end)
+        return Reservation(
+            id=row["id"],
+            room_id=room_id,
+            user_id=user_id,
+            is_public=is_public,
+            meta=meta,
+            start=start,
+            end=end,
+        )
+
+    async def cancel(self, reservation) -> None:
+        """Deletes a reservation and drops it from the index"""
+        await reservation.delete()
+        self.discard(reservation.room_id, reservation.id)
@@ -3,6 +3,7 @@ File containing initial configuration and startup/ shutdown coroutines
 """
 
 import os
+import typing
 from os import getenv
 from quart import Config as BaseConfig
 from dotenv import load_dotenv
@@ -26,10 +27,61 @@ def get_url() -> str:
     return url
 
 
+def get_secret() -> typing.Union[str, bytes]:
+    if (secret := getenv("SECRET")) is not None:
+        return secret
+    if os.environ.get("CI"):
+        return gen_secret()
+    # Keys cookies and API tokens (see models.ApiToken), a random secret
+    # would invalidate both on every restart and differ between workers
+    raise EnvironmentError("Environment Variable SECRET was not found")
+
+
 class config:
     DATABASE_URL = get_url()
+    SECRET = get_secret()
     HTTPSREDIRECT = getenv("HTTPSREDIRECT", 0)
     DEBUG = getenv("DEBUG", True)
+    TRANSLATION_CACHE_LISTEN = getenv("TRANSLATION_CACHE_LISTEN", "0") == "1"
+    ROLE_CACHE_LISTEN = getenv("ROLE_CACHE_LISTEN", "0") == "1"
+    PAGE_CACHE_LISTEN = getenv("PAGE_CACHE_LISTEN", "0") == "1"
+    # Incremental translation cache refreshes (see TranslationCache.refresh)
+    TRANSLATION_CACHE_REFRESH_INTERVAL = float(
+        getenv("TRANSLATION_CACHE_REFRESH_INTERVAL", 0)
+    )
+    TRANSLATION_CACHE_FULL_REFRESH_INTERVAL = float(
+        getenv("TRANSLATION_CACHE_FULL_REFRESH_INTERVAL", 3600)
+    )
+    TRANSLATION_CACHE_VERSION_MARGIN = int(
+        getenv("TRANSLATION_CACHE_VERSION_MARGIN", 100)
+    )
+    # Seconds between checks of the LISTEN connection (see helper.Listener)
+    LISTEN_CHECK_INTERVAL = float(getenv("LISTEN_CHECK_INTERVAL", 5))
+    TEMPLATE_CACHE_DIR = getenv("TEMPLATE_CACHE_DIR", None)
+    TEMPLATE_WARMUP = getenv("TEMPLATE_WARMUP", "0") == "1"
+    # Total connections of all workers, split per worker (see Gino.pool_size)
+    DB_CONNECTION_BUDGET = int(getenv("DB_CONNECTION_BUDGET", 0)) or None
+    DB_WORKERS = int(getenv("WEB_CONCURRENCY", 1))
+    # Connections every worker opens outside of its pool (helper.Listener)
+    DB_RESERVED_CONNECTIONS = int(
+        TRANSLATION_CACHE_LISTEN or ROLE_CACHE_LISTEN or PAGE_CACHE_LISTEN
+    )
+    # Comma separated DSNs of read replicas (see GinoEngine.route)
+    DB_REPLICA_URLS = [
+        url for url in getenv("DATABASE_REPLICA_URLS", "").split(",") if url
+    ]
+    DB_REPLICA_PIN_SECONDS = float(getenv("DB_REPLICA_PIN_SECONDS", 0))
+    # Directory shared by all workers for merging their metrics (see app/metrics.py)
+    METRICS_DIR = getenv("METRICS_DIR", None)
+    METRICS_INTERVAL = float(getenv("METRICS_INTERVAL", 5))
+    # Log queries slower than SLOW_QUERY_MS (see app/slowlog.py)
+    SLOW_QUERY_MS = float(getenv("SLOW_QUERY_MS", 0)) or None
+    SLOW_QUERY_EXPLAIN = getenv("SLOW_QUERY_EXPLAIN", "0") == "1"
+    SLOW_QUERY_EXPLAIN_INTERVAL = float(getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 60))
+    SLOW_QUERY_EXPLAIN_TIMEOUT = int(getenv("SLOW_QUERY_EXPLAIN_TIMEOUT", 5000))
+    # Room calendar feeds (see app/ical.py)
+    CALENDAR_CACHE_SIZE = int(getenv("CALENDAR_CACHE_SIZE", 50000))
+    CALENDAR_PAST_DAYS = int(getenv("CALENDAR_PAST_DAYS", 30))
 
 
 async def LoadDB() -> None:
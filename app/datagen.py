@@ -0,0 +1,206 @@
+__doc__ = """
+Synthetic data for load tests (``toolkit.py generate-data``).
+
+Rows are generated lazily and loaded with ``COPY`` in batches. Everything is
+derived from the seed (reservations from a per-room generator seeded with the
+seed and room), so the same seed and start date always produce the same
+data. Reservations follow office patterns: weekdays, business hours peaking
+late morning and early afternoon, weekly recurring series and a few hot rooms
+taking a large share of all bookings. They never overlap per room.
+"""
+
+import typing
+from datetime import date, datetime, timedelta
+from itertools import islice
+from random import Random
+from ujson import dumps
+
+BATCH_SIZE = 50000
+# Half hour slots between 08:00 and 18:00
+SLOT = timedelta(minutes=30)
+DAY_START, SLOTS_PER_DAY = timedelta(hours=8), 20
+# Booking length in slots and its weight
+DURATIONS, DURATION_WEIGHTS = (1, 2, 3, 4, 6, 8), (10, 35, 15, 25, 10, 5)
+# Hot rooms: the n-th most popular room gets a share proportional to n^-ROOM_SKEW
+ROOM_SKEW = 0.8
+MAX_OCCUPANCY = 0.85
+RECURRING_SHARE = 0.3
+
+FIRST_NAMES = (
+    "anna", "ben", "clara", "david", "emma", "felix", "greta", "hannah", "jonas",
+    "lea", "lukas", "maria", "noah", "paul", "sophie", "tim", "yusuf", "zoe",
+)  # fmt: skip
+LAST_NAMES = (
+    "bauer", "becker", "fischer", "hoffmann", "koch", "meyer", "mueller",
+    "richter", "schmidt", "schneider", "schulz", "wagner", "weber", "wolf",
+)  # fmt: skip
+BUILDINGS = ("north", "south", "east", "west", "annex", "lab")
+CAPACITIES, CAPACITY_WEIGHTS = (2, 4, 6, 8, 12, 20, 40, 100), (
+    5,
+    20,
+    20,
+    15,
+    15,
+    10,
+    10,
+    5,
+)
+EQUIPMENT = ("projector", "whiteboard", "video", "phone")
+
+
+def users(rng: Random, first_id: int, count: int, password: str) -> typing.Iterator:
+    """(id, username, e_mail, gravatar, password, is_superuser, is_suspended)"""
+    for id in range(first_id, first_id + count):
+        name = f"{rng.choice(FIRST_NAMES)}.{rng.choice(LAST_NAMES)}{id}"
+        yield id, name, f"{name}@example.org", False, password, False, rng.random() < 0.02
+
+
+def roles(first_id: int, count: int) -> typing.Iterator:
+    """(id, name)"""
+    for id in range(first_id, first_id + count):
+        yield id, f"role-{id}"
+
+
+def skewed(rng: Random, first_id: int, count: int) -> int:
+    """Picks an id, the first ones much more often than the last ones"""
+    return first_id + int(count * rng.random() ** 2)
+
+
+def user_roles(
+    rng: Random, user_ids: range, role_ids: range, first_id: int
+) -> typing.Iterator:
+    """(id, user_id, role_id), 0-3 roles per user, few roles hold most users"""
+    id = first_id
+    for user_id in user_ids:
+        picked = {
+            skewed(rng, role_ids.start, len(role_ids))
+            for _ in range(rng.choices((0, 1, 2, 3), (20, 50, 20, 10))[0])
+        }
+        for role_id in sorted(picked):
+            yield id, user_id, role_id
+            id += 1
+
+
+def rooms(rng: Random, first_id: int, count: int, user_ids: range) -> typing.Iterator:
+    """(id, nick, description, meta, master_id)"""
+    for id in range(first_id, first_id + count):
+        building = rng.choice(BUILDINGS)
+        meta = dict(
+            capacity=rng.choices(CAPACITIES, CAPACITY_WEIGHTS)[0],
+            building=building,
+            floor=rng.randint(0, 6),
+        )
+        for equipment in EQUIPMENT:
+            meta[equipment] = "yes" if rng.random() < 0.5 else "no"
+        nick = f"{building}-{meta['floor']}.{id}"
+        yield id, nick, f"Room {nick}", dumps(meta), rng.choice(user_ids)
+
+
+def room_shares(rng: Random, room_ids: range, total: int, capacity: int) -> dict:
+    """Splits total reservations over rooms (hot rooms first, capped per room)"""
+    order = list(room_ids)
+    rng.shuffle(order)
+    weights = {room: (rank + 1) ** -ROOM_SKEW for rank, room in enumerate(order)}
+    shares, remaining = dict(), total
+    # Hand out overflow of full rooms to the others until nothing is left
+    while remaining > 0 and weights:
+        weight_sum = sum(weights.values())
+        handed_out = 0
+        for room, weight in list(weights.items()):
+            share = min(
+                capacity - shares.get(room, 0),
+                remaining - handed_out,
+                max(1, round(remaining * weight / weight_sum)),
+            )
+            shares[room] = shares.get(room, 0) + share
+            handed_out += share
+            if shares[room] >= capacity:
+                del weights[room]
+            if handed_out >= remaining:
+                break
+        remaining -= handed_out
+    return shares
+
+
+def room_reservations(
+    seed: int, room_id: int, count: int, start: date, days: int, user_ids: range
+) -> typing.Iterator:
+    """(room_id, user_id, is_public, start, end) of a single room"""
+    rng = Random(f"{seed}-room-{room_id}")
+    taken = bytearray(days * SLOTS_PER_DAY)
+    booked = 0
+
+    def book(day: int, slot: int, length: int, user_id: int, public: bool):
+        nonlocal booked
+        first = day * SLOTS_PER_DAY + slot
+        if slot + length > SLOTS_PER_DAY or any(taken[first : first + length]):
+            return None
+        taken[first : first + length] = b"\x01" * length
+        booked += 1
+        begin = datetime.combine(start + timedelta(days=day), datetime.min.time())
+        begin += DAY_START + slot * SLOT
+        return room_id, user_id, public, begin, begin + length * SLOT
+
+    def pick_slot(length: int) -> int:
+        # Peaks around 10:00 and 14:00, never past closing time
+        peak = rng.choice((4, 12))
+        slot = int(rng.triangular(0, SLOTS_PER_DAY - length, peak))
+        return min(slot, SLOTS_PER_DAY - length)
+
+    # Weekly series (team meetings, lectures)
+    attempts = 0
+    while booked < count * RECURRING_SHARE and attempts < count:
+        attempts += 1
+        length = rng.choices(DURATIONS, DURATION_WEIGHTS)[0]
+        day, slot = rng.randrange(min(days, 5)), pick_slot(length)
+        user_id, public = skewed(rng, user_ids.start, len(user_ids)), True
+        for week_day in range(day, days, 7 * rng.choice((1, 1, 1, 2))):
+            if booked >= count:
+                break
+            row = book(week_day, slot, length, user_id, public)
+            if row is not None:
+                yield row
+
+    # One off bookings, mostly on weekdays
+    attempts = 0
+    while booked < count and attempts < count * 4:
+        attempts += 1
+        day = rng.randrange(days)
+        if day % 7 >= 5 and rng.random() > 0.05:
+            continue
+        length = rng.choices(DURATIONS, DURATION_WEIGHTS)[0]
+        row = book(
+            day,
+            pick_slot(length),
+            length,
+            skewed(rng, user_ids.start, len(user_ids)),
+            rng.random() < 0.7,
+        )
+        if row is not None:
+            yield row
+
+
+def reservations(
+    seed: int,
+    rng: Random,
+    room_ids: range,
+    user_ids: range,
+    total: int,
+    start: date,
+    weeks: int,
+    first_id: int,
+) -> typing.Iterator:
+    """(id, room_id, user_id, is_public, start, end)"""
+    days = weeks * 7
+    capacity = int(weeks * 5 * SLOTS_PER_DAY * MAX_OCCUPANCY / 3)
+    id = first_id
+    for room_id, count in sorted(room_shares(rng, room_ids, total, capacity).items()):
+        for row in room_reservations(seed, room_id, count, start, days, user_ids):
+            yield (id,) + row
+            id += 1
+
+
+def batches(rows: typing.Iterable, size: int = BATCH_SIZE) -> typing.Iterator[list]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
@@ -1,12 +1,29 @@
 import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from math import ceil
+from time import perf_counter, time
 
 from gino.api import Gino as _Gino, GinoExecutor as _Executor
+from gino.bakery import BakedQuery
 from gino.engine import GinoConnection as _Connection, GinoEngine as _Engine
 from gino.strategies import GinoStrategy
 from quart import Quart, request
 from sqlalchemy.engine.url import make_url, URL
+from sqlalchemy.sql.selectable import Select
 from quart.exceptions import NotFound
 
+# Replica routing state of the current request/ context (see GinoEngine.route)
+_routing = ContextVar("gino_routing", default=None)
+PIN_COOKIE = "db-primary-until"
+
+
+def is_read_only(clause) -> bool:
+    """Whether clause is a plain SELECT (baked or not)"""
+    if isinstance(clause, BakedQuery):
+        clause = clause.query
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
 
 class QuartModelMixin:
     @classmethod
@@ -41,6 +58,43 @@ class GinoExecutor(_Executor):
 
 
 class GinoConnection(_Connection):
+    # Callables (connection, clause, multiparams, params, duration, rows) that
+    # are notified after every query, e.g. by app.metrics
+    observers = []
+
+    def notify(self, clause, multiparams, params, started: float, rows: int):
+        duration = perf_counter() - started
+        for observer in self.observers:
+            observer(self, clause, multiparams, params, duration, rows)
+
+    async def all(self, clause, *multiparams, **params):
+        started = perf_counter()
+        rv = await super().all(clause, *multiparams, **params)
+        if self.observers:
+            self.notify(clause, multiparams, params, started, len(rv))
+        return rv
+
+    async def first(self, clause, *multiparams, **params):
+        started = perf_counter()
+        rv = await super().first(clause, *multiparams, **params)
+        if self.observers:
+            self.notify(clause, multiparams, params, started, int(rv is not None))
+        return rv
+
+    async def scalar(self, clause, *multiparams, **params):
+        started = perf_counter()
+        rv = await super().scalar(clause, *multiparams, **params)
+        if self.observers:
+            self.notify(clause, multiparams, params, started, 1)
+        return rv
+
+    async def status(self, clause, *multiparams, **params):
+        started = perf_counter()
+        rv = await super().status(clause, *multiparams, **params)
+        if self.observers:
+            self.notify(clause, multiparams, params, started, len(rv[1] or []))
+        return rv
+
     async def first_or_404(self, *args, **kwargs):
         rv = await self.first(*args, **kwargs)
         if rv is None:
@@ -50,6 +104,84 @@ class GinoConnection(_Connection):
 
 class GinoEngine(_Engine):
     connection_cls = GinoConnection
+    # Engines of read replicas, only set on the primary (see Gino.init_app)
+    replicas = ()
+    _next_replica = 0
+
+    def replica(self) -> "GinoEngine":
+        """Picks the next replica (round robin), the primary without replicas"""
+        if not self.replicas:
+            return self
+        self._next_replica = (self._next_replica + 1) % len(self.replicas)
+        return self.replicas[self._next_replica]
+
+    def route(self, clause) -> "GinoEngine":
+        """Picks the engine to run clause on
+
+        Read-only baked queries, and all read-only queries of routes marked
+        with :meth:`Gino.read_only`, go to a replica. Writes, transactions and
+        reads after a write (in the same request or while the client is
+        pinned, see ``DB_REPLICA_PIN_SECONDS``) stay on the primary.
+        All reads of a request go to the same replica, replicas may lag by
+        different amounts.
+        """
+        if not self.replicas:
+            return self
+        state = _routing.get()
+        if not is_read_only(clause):
+            if state is not None:
+                state["wrote"] = True
+            return self
+        if state is not None and (state["primary"] or state["wrote"]):
+            return self
+        read_only = state is not None and state["read_only"]
+        if not (read_only or isinstance(clause, BakedQuery)):
+            return self
+        conn = self.current_connection
+        if conn is not None and conn.raw_connection is not None:
+            if conn.raw_connection.is_in_transaction():
+                return self
+        if state is None:
+            return self.replica()
+        if state["replica"] is None:
+            state["replica"] = self.replica()
+        return state["replica"]
+
+    async def all(self, clause, *multiparams, **params):
+        async with self.route(clause).acquire(reuse=True) as conn:
+            return await conn.all(clause, *multiparams, **params)
+
+    async def first(self, clause, *multiparams, **params):
+        async with self.route(clause).acquire(reuse=True) as conn:
+            return await conn.first(clause, *multiparams, **params)
+
+    async def one_or_none(self, clause, *multiparams, **params):
+        async with self.route(clause).acquire(reuse=True) as conn:
+            return await conn.one_or_none(clause, *multiparams, **params)
+
+    async def one(self, clause, *multiparams, **params):
+        async with self.route(clause).acquire(reuse=True) as conn:
+            return await conn.one(clause, *multiparams, **params)
+
+    async def scalar(self, clause, *multiparams, **params):
+        async with self.route(clause).acquire(reuse=True) as conn:
+            return await conn.scalar(clause, *multiparams, **params)
+
+    async def status(self, clause, *multiparams, **params):
+        # Used for writes (e.g. Model.delete(), update().apply()), always run
+        # on the primary and pin later reads of the request to it
+        state = _routing.get()
+        if state is not None:
+            state["wrote"] = True
+        async with self.acquire(reuse=True) as conn:
+            return await conn.status(clause, *multiparams, **params)
+
+    def iterate(self, clause, *multiparams, **params):
+        """Iterates on the current connection of the engine clause is routed to"""
+        engine = self.route(clause)
+        if engine is not self:
+            return engine.iterate(clause, *multiparams, **params)
+        return super().iterate(clause, *multiparams, **params)
 
     async def first_or_404(self, *args, **kwargs):
         rv = await self.first(*args, **kwargs)
@@ -81,6 +213,11 @@ class Gino(_Gino):
         await request.connection.release(permanent=False)
     This doesn't apply to websocket, because websocket is usually a long
     connection, so it's not efficient to hold the connection.
+    Routes that never query (or query on their own connection) can opt out
+    with :meth:`no_connection`/ :meth:`exempt_blueprint`. ``request_stats``
+    counts acquired, actually used and skipped request connections.
+    With ``DB_REPLICA_URLS`` set reads are routed to replicas, see
+    :meth:`GinoEngine.route` and :meth:`read_only`.
     """
 
     model_base_classes = _Gino.model_base_classes + (QuartModelMixin,)
@@ -104,27 +241,85 @@ class Gino(_Gino):
         self.config["echo"] = kwargs.pop("echo", False)
         self.config["min_size"] = kwargs.pop("pool_min_size", 5)
         self.config["max_size"] = kwargs.pop("pool_max_size", 10)
+        self.config["connection_budget"] = kwargs.pop("connection_budget", None)
+        self.config["workers"] = kwargs.pop("workers", 1)
+        self.config["reserved_connections"] = kwargs.pop("reserved_connections", 0)
         self.config["ssl"] = kwargs.pop("ssl", None)
         self.config["use_connection_for_request"] = kwargs.pop(
             "use_connection_for_request", True
         )
+        self.config["replica_dsns"] = kwargs.pop("replica_dsns", None) or []
+        self.config["replica_pin_seconds"] = kwargs.pop("replica_pin_seconds", 0)
         self.config["kwargs"] = kwargs.pop("kwargs", dict())
+        self.exempt_blueprints = set()
+        self.request_stats = dict(acquired=0, used=0, skipped=0)
 
         super().__init__(*args, **kwargs)
         if app is not None:
             self.init_app(app)
 
     def init_app(self, app: Quart):
+        pin_seconds = app.config.setdefault(
+            "DB_REPLICA_PIN_SECONDS", self.config["replica_pin_seconds"]
+        )
+
+        @app.before_request
+        async def start_routing():
+            if self.bind and self.bind.replicas:
+                view = app.view_functions.get(request.endpoint or "", None)
+                try:
+                    pinned = float(request.cookies.get(PIN_COOKIE, 0)) > time()
+                except ValueError:
+                    pinned = False
+                _routing.set(
+                    dict(
+                        read_only=getattr(view, "gino_read_only", False),
+                        primary=pinned,
+                        wrote=False,
+                        replica=self.bind.replica(),
+                    )
+                )
+
+        @app.after_request
+        async def pin_after_write(response):
+            state = _routing.get()
+            if pin_seconds and state is not None and state["wrote"]:
+                # Read your writes: this client reads from the primary for a while
+                response.set_cookie(
+                    PIN_COOKIE,
+                    str(time() + pin_seconds),
+                    max_age=ceil(pin_seconds),
+                    httponly=True,
+                    samesite="Lax",
+                )
+            return response
+
         if app.config.get("DB_USE_CONNECTION_FOR_REQUEST", True):
 
             @app.before_request
             async def before_request():
-                request.connection = await self.acquire(lazy=True)
+                if self.uses_connection(app):
+                    view = app.view_functions.get(request.endpoint or "", None)
+                    if getattr(view, "gino_read_only", False):
+                        state = _routing.get()
+                        if state is not None:
+                            engine = state["replica"]
+                        else:
+                            engine = self.bind.replica()
+                    else:
+                        engine = self.bind
+                    request.connection = await engine.acquire(lazy=True)
+                    self.request_stats["acquired"] += 1
+                else:
+                    self.request_stats["skipped"] += 1
 
             @app.after_request
             async def after_response(response):
                 conn = getattr(request, "connection", None)
                 if conn is not None:
+                    # Lazy connections only hold a raw connection once used
+                    if conn.raw_connection is not None:
+                        self.request_stats["used"] += 1
                     await conn.release()
                     del request.connection
                 return response
@@ -142,15 +337,145 @@ class Gino(_Gino):
                     database=app.config.setdefault("DB_DATABASE", "postgres"),
                 )
 
+            min_size, max_size = self.pool_size(app)
+            # prebake prepares every @db.bake query on each new pool connection
             await self.set_bind(
                 dsn,
                 echo=app.config.setdefault("DB_ECHO", False),
-                min_size=app.config.setdefault("DB_POOL_MIN_SIZE", 5),
-                max_size=app.config.setdefault("DB_POOL_MAX_SIZE", 10),
+                min_size=min_size,
+                max_size=max_size,
                 ssl=app.config.setdefault("DB_SSL"),
                 loop=asyncio.get_event_loop(),
+                prebake=True,
                 **app.config.setdefault("DB_KWARGS", dict()),
             )
+            await self.warm_up(min_size)
+            app.logger.info(
+                "Database pool ready (min_size=%d, max_size=%d)", min_size, max_size
+            )
+
+            replica_dsns = app.config.setdefault(
+                "DB_REPLICA_URLS", self.config["replica_dsns"]
+            )
+            if replica_dsns:
+                from gino import create_engine
+
+                # Same pool size per replica, the budget is per database server
+                # Baked queries are prepared on first use per replica connection
+                replicas = []
+                for replica_dsn in replica_dsns:
+                    replica = await create_engine(
+                        make_url(replica_dsn),
+                        strategy="quart",
+                        echo=app.config["DB_ECHO"],
+                        min_size=min_size,
+                        max_size=max_size,
+                        ssl=app.config["DB_SSL"],
+                        loop=asyncio.get_event_loop(),
+                        **app.config["DB_KWARGS"],
+                    )
+                    await self.warm_up(min_size, replica)
+                    replicas.append(replica)
+                self.bind.replicas = replicas
+                app.logger.info("Routing reads to %d replicas", len(replicas))
+
+        @app.after_serving
+        async def close_replicas():
+            if self.bind:
+                replicas, self.bind.replicas = self.bind.replicas, ()
+                for replica in replicas:
+                    await replica.close()
+
+    def pool_size(self, app: Quart) -> tuple:
+        """Derives (min_size, max_size) of this worker's pool
+
+        With ``DB_CONNECTION_BUDGET`` set, the budget (total connections all
+        workers may open) is split evenly between ``DB_WORKERS`` workers, minus
+        the ``DB_RESERVED_CONNECTIONS`` each worker opens outside of its pool
+        (e.g. for LISTEN). Otherwise ``DB_POOL_MIN_SIZE``/ ``DB_POOL_MAX_SIZE`` are used as is.
+        """
+        min_size = app.config.setdefault("DB_POOL_MIN_SIZE", self.config["min_size"])
+        max_size = app.config.setdefault("DB_POOL_MAX_SIZE", self.config["max_size"])
+        budget = app.config.setdefault(
+            "DB_CONNECTION_BUDGET", self.config["connection_budget"]
+        )
+        if budget:
+            workers = max(
+                1, app.config.setdefault("DB_WORKERS", self.config["workers"])
+            )
+            reserved = app.config.setdefault(
+                "DB_RESERVED_CONNECTIONS", self.config["reserved_connections"]
+            )
+            max_size = max(1, budget // workers - reserved)
+        return min(min_size, max_size), max_size
+
+    async def warm_up(self, size: int, engine=None):
+        """Opens (and prebakes) size connections before the first request"""
+        engine = engine or self.bind
+        connections = await asyncio.gather(
+            *[engine.acquire(reuse=False) for _ in range(size)]
+        )
+        try:
+            await asyncio.gather(*[conn.scalar("SELECT 1") for conn in connections])
+        finally:
+            await asyncio.gather(*[conn.release() for conn in connections])
+
+    def no_connection(self, view):
+        """Decorator: don't borrow a connection for requests to this route
+
+        Queries made by such routes still work, but acquire their own
+        connection. Static files are always exempt.
+        """
+        view.gino_no_connection = True
+        return view
+
+    def read_only(self, view):
+        """Decorator: run all reads of this route on a replica
+
+        Without the decorator only baked queries are sent to replicas. Writes
+        still go to the primary (and pin later reads of the request to it).
+        """
+        view.gino_read_only = True
+        return view
+
+    @contextmanager
+    def use_primary(self):
+        """Runs the queries of the with block on the primary, e.g. to fill
+        caches right after another worker announced a change"""
+        token = _routing.set(
+            dict(read_only=False, primary=True, wrote=False, replica=None)
+        )
+        try:
+            yield
+        finally:
+            _routing.reset(token)
+
+    @contextmanager
+    def use_replica(self):
+        """Runs read-only queries of the with block on a replica (the one of
+        the current request, if any)"""
+        outer = _routing.get()
+        replica = outer["replica"] if outer is not None else None
+        token = _routing.set(
+            dict(read_only=True, primary=False, wrote=False, replica=replica)
+        )
+        try:
+            yield
+        finally:
+            _routing.reset(token)
+
+    def exempt_blueprint(self, blueprint) -> None:
+        """Don't borrow a connection for requests to any route of blueprint"""
+        self.exempt_blueprints.add(getattr(blueprint, "name", blueprint))
+
+    def uses_connection(self, app: Quart) -> bool:
+        endpoint = request.endpoint or ""
+        if endpoint == "static" or endpoint.endswith(".static"):
+            return False
+        if request.blueprint in self.exempt_blueprints:
+            return False
+        view = app.view_functions.get(endpoint, None)
+        return not getattr(view, "gino_no_connection", False)
 
     async def first_or_404(self, *args, **kwargs):
         rv = await self.first(*args, **kwargs)
@@ -0,0 +1,61 @@
+__doc__ = """
+Bounded worker pool for password and token hashing.
+
+PBKDF2 takes tens of milliseconds per call and would block the event loop of
+the uvicorn worker. hashlib releases the GIL while hashing, so a small thread
+pool is enough to run it concurrently with request handling.
+"""
+
+import typing
+from asyncio import get_event_loop
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from os import cpu_count
+from quart import Quart
+
+
+class PoolSaturated(Exception):
+    """Raised instead of queueing when the hash pool is at its queue depth"""
+
+
+class HashPool:
+    def __init__(self, app: Quart):
+        self.app = app
+        self.workers = app.config.get("HASH_POOL_WORKERS", None) or cpu_count() or 1
+        self.queue_depth = app.config.get("HASH_POOL_QUEUE_DEPTH", None)
+        if self.queue_depth is None:
+            self.queue_depth = self.workers * 4
+        self.executor, self.pending = None, 0
+
+        @app.after_serving
+        async def shutdown_hash_pool():
+            self.shutdown()
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.workers + self.queue_depth
+
+    async def run(self, func: typing.Callable, *args, **kwargs):
+        """Runs func in the pool and waits for its result
+
+        Raises:
+            PoolSaturated: if workers and queue are already occupied
+        """
+        if self.saturated:
+            raise PoolSaturated()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="hash"
+            )
+        self.pending += 1
+        try:
+            return await get_event_loop().run_in_executor(
+                self.executor, partial(func, *args, **kwargs)
+            )
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
@@ -1,7 +1,19 @@
+import csv
 import typing
-from quart import Quart, request
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from binascii import Error as BinasciiError
+from time import perf_counter, monotonic
+from collections import OrderedDict
+from types import MappingProxyType
+from datetime import date, datetime
+from io import StringIO
+from quart import Quart, Response, request, current_app, stream_with_context
 from os import getenv
+import asyncio
+import asyncpg
 from asyncio import run
+from functools import partial
+from ujson import dumps, loads
 
 
 async def connect():
@@ -26,32 +38,551 @@ def coro(f):
     return run(f)
 
 
+def escape_like(term: str) -> str:
+    """Escapes LIKE/ ILIKE wildcards in term"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def encode_cursor(*values) -> str:
+    """Encodes keyset pagination values into an opaque, url safe token"""
+    return urlsafe_b64encode(dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+# Keyset ids are int4 columns
+INT4_RANGE = range(-(2**31), 2**31)
+
+
+def decode_cursor(
+    cursor: str, size: int, types: typing.Optional[typing.Tuple[type, ...]] = None
+) -> list:
+    """Decodes a token created by :func:`encode_cursor`
+
+    Args:
+        cursor (str): token
+        size (int): expected number of values
+        types (typing.Optional[typing.Tuple[type, ...]], optional): expected
+            type of every value (ints must fit int4). Defaults to None.
+
+    Raises:
+        ValueError: if the token is malformed
+
+    Returns:
+        list: keyset pagination values
+    """
+    try:
+        values = loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (BinasciiError, ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Malformed cursor")
+    if types is not None and not all(
+        type(value) is expected and (expected is not int or value in INT4_RANGE)
+        for value, expected in zip(values, types)
+    ):
+        raise ValueError("Malformed cursor")
+    return values
+
+
+STREAM_CHUNK_SIZE = 8192
+
+
+async def stream_template(template_name: str, **context) -> Response:
+    """Renders a template as streamed response (like render_template)
+
+    Output is flushed in chunks of about ``STREAM_CHUNK_SIZE`` characters, so
+    the head of base.html is sent before the (lazily loaded) rows are rendered.
+    """
+    template = current_app.jinja_env.get_or_select_template(template_name)
+    await current_app.update_template_context(context)
+
+    @stream_with_context
+    async def generate():
+        buffer, size = [], 0
+        async for chunk in template.generate_async(context):
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer).encode("utf-8")
+                buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer).encode("utf-8")
+
+    return Response(generate(), mimetype="text/html")
+
+
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_value(value) -> typing.Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def stream_export(
+    query, columns: typing.Sequence[str], export_format: str, chunk_size: int = 1000
+) -> Response:
+    """Streams the (tuple) rows of query as NDJSON or CSV
+
+    Rows are fetched in chunks from a server side cursor and every chunk is
+    serialized and sent before the next one is fetched, so memory use does
+    not depend on the size of the export.
+
+    Args:
+        query: select returning one value per column
+        columns (typing.Sequence[str]): column names (object keys/ csv header)
+        export_format (str): ``"ndjson"`` or ``"csv"``
+        chunk_size (int, optional): rows fetched per round trip. Defaults to 1000.
+    """
+    from . import db
+
+    async def generate():
+        if export_format == "csv":
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode("utf-8")
+        async with db.bind.route(query).acquire(reuse=False) as conn:
+            async with conn.transaction():
+                cursor = await conn.iterate(query)
+                while rows := await cursor.many(chunk_size):
+                    if export_format == "csv":
+                        buffer.seek(0)
+                        buffer.truncate()
+                        for row in rows:
+                            writer.writerow(
+                                [
+                                    (
+                                        dumps(value)
+                                        if isinstance(value, (dict, list))
+                                        else value
+                                    )
+                                    for value in map(export_value, row)
+                                ]
+                            )
+                        yield buffer.getvalue().encode("utf-8")
+                    else:
+                        yield "".join(
+                            dumps(dict(zip(columns, map(export_value, row)))) + "\n"
+                            for row in rows
+                        ).encode("utf-8")
+
+    response = Response(generate(), mimetype=EXPORT_MIMETYPES[export_format])
+    # Exports may take longer than RESPONSE_TIMEOUT to send
+    response.timeout = None
+    return response
+
+
+class StreamedPage:
+    """Async iterable over one keyset paginated page of a (baked) query
+
+    Rows are fetched in chunks from a server side cursor, inside a transaction
+    on a dedicated (replica) connection, while iterating (e.g. from a streamed
+    template).
+    After iteration :attr:`next_cursor` holds the token of the next page.
+
+    Args:
+        query: query with a ``limit`` bind parameter
+        limit (int): rows per page
+        key (typing.Callable): returns the keyset values of a row
+        on_chunk (typing.Optional[typing.Callable], optional): coroutine called with
+            every chunk of rows before they are yielded. Defaults to None.
+        chunk_size (int, optional): rows fetched per round trip. Defaults to 100.
+        **params: further bind parameters of query
+    """
+
+    def __init__(
+        self,
+        query,
+        limit: int,
+        key: typing.Callable[[typing.Any], tuple],
+        on_chunk: typing.Optional[typing.Callable] = None,
+        chunk_size: int = 100,
+        **params,
+    ):
+        self.query, self.limit, self.key = query, limit, key
+        self.on_chunk, self.chunk_size, self.params = on_chunk, chunk_size, params
+        self.next_cursor = None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        from . import db
+
+        # Replica or primary, as for any other read of self.query
+        async with db.bind.route(self.query).acquire(reuse=False) as conn:
+            async with conn.transaction():
+                cursor = await conn.iterate(
+                    self.query, limit=self.limit + 1, **self.params
+                )
+                remaining, last = self.limit, None
+                while remaining > 0:
+                    rows = await cursor.many(min(self.chunk_size, remaining))
+                    if not rows:
+                        return
+                    remaining -= len(rows)
+                    if self.on_chunk is not None:
+                        await self.on_chunk(rows)
+                    for row in rows:
+                        yield row
+                    last = rows[-1]
+                if await cursor.next() is not None:
+                    self.next_cursor = encode_cursor(*self.key(last))
+
+
+def warm_templates(app: Quart) -> int:
+    """Loads every template into the jinja environment (and bytecode cache)
+
+    Returns:
+        int: number of loaded templates
+    """
+    started, names = perf_counter(), app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    app.logger.info(
+        "%d templates loaded in %.2f ms", len(names), (perf_counter() - started) * 1000
+    )
+    return len(names)
+
+
+class Listener:
+    """LISTEN connection of a worker, shared by all subscribed channels
+
+    The connection is opened outside of the pool (it is held as long as the
+    worker runs), see ``DB_RESERVED_CONNECTIONS``. It is checked every ``LISTEN_CHECK_INTERVAL`` seconds and
+    opened again once it dropped. Notifications sent in between are lost, so
+    subscribers are asked to resync after a reconnect. Coroutines returned by
+    callbacks run as tasks that are kept until done, their errors are logged.
+    """
+
+    def __init__(self, app: Quart):
+        self.app, self.channels, self.tasks = app, dict(), set()
+        self.connection = self.watchdog = None
+        self.interval = float(app.config.get("LISTEN_CHECK_INTERVAL", 5))
+
+    def subscribe(
+        self,
+        channel: str,
+        callback: typing.Callable[[str], typing.Any],
+        on_reconnect: typing.Optional[typing.Callable] = None,
+    ) -> None:
+        """Calls callback with the payload of every notification on channel
+
+        Args:
+            channel (str): channel to LISTEN on
+            callback (typing.Callable[[str], typing.Any]): may return a coroutine
+            on_reconnect (typing.Optional[typing.Callable], optional): coroutine
+                function called after a reconnect. Defaults to None.
+        """
+        self.channels[channel] = (callback, on_reconnect)
+
+    async def connect(self):
+        from . import db
+
+        url = db.config["dsn"]
+        self.connection = await asyncpg.connect(
+            host=url.host,
+            port=url.port,
+            user=url.username,
+            password=url.password,
+            database=url.database,
+            ssl=self.app.config.get("DB_SSL", None),
+        )
+        for channel in self.channels:
+            await self.connection.add_listener(channel, self.notify)
+
+    async def close(self):
+        connection, self.connection = self.connection, None
+        if connection is not None and not connection.is_closed():
+            await connection.close()
+
+    async def start(self):
+        if self.channels:
+            await self.connect()
+            self.watchdog = asyncio.ensure_future(self.watch())
+            self.app.logger.info("Listening on %s", ", ".join(self.channels))
+
+    async def stop(self):
+        if self.watchdog is not None:
+            self.watchdog.cancel()
+            self.watchdog = None
+        for task in list(self.tasks):
+            task.cancel()
+        await self.close()
+
+    def is_closed(self) -> bool:
+        return self.connection is None or self.connection.is_closed()
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.is_closed():
+                continue
+            self.app.logger.warning("LISTEN connection lost, reconnecting")
+            try:
+                await self.close()
+                await self.connect()
+            except Exception:
+                self.connection = None
+                self.app.logger.exception("Reconnecting LISTEN connection failed")
+                continue
+            for callback, on_reconnect in self.channels.values():
+                if on_reconnect is not None:
+                    self.spawn(on_reconnect())
+
+    def notify(self, connection, pid: int, channel: str, payload: str):
+        try:
+            result = self.channels[channel][0](payload)
+        except Exception:
+            self.app.logger.exception("Handling notification on %s failed", channel)
+            return
+        if asyncio.iscoroutine(result):
+            self.spawn(result)
+
+    def spawn(self, coroutine: typing.Coroutine) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.app.logger.error(
+                "Notification handler failed", exc_info=task.exception()
+            )
+
+
 class TranslationCache:
+    channel = "translationunits"
+
     def __init__(
         self, app: Quart, langs: typing.List[str] = ["en", "de"], refresh: bool = True
     ):
-        self.translations, self.app, self.langs = dict.fromkeys(langs), app, langs
+        self.app, self.langs = app, langs
+        self.translations = {lang: MappingProxyType({}) for lang in langs}
         self.default = app.config.get("BABEL_DEFAULT_LOCALE", "en")
+        self.version, self.stats = None, dict(duration=0.0, rows=0, refreshes=0)
+        # Lookup counters, exported by app.metrics
+        self.stats.update(hits=0, misses=0)
+        # Incremented on every swap, used as data version by the page cache
+        self.revision = 0
+        # Versions are taken by nextval() at statement time, a transaction
+        # holding an older version may commit after a newer one was read.
+        # Incremental refreshes re-read the last `margin` versions, periodic
+        # full refreshes catch anything older (and deleted units).
+        self.margin = int(app.config.get("TRANSLATION_CACHE_VERSION_MARGIN", 100))
+        self.interval = float(app.config.get("TRANSLATION_CACHE_REFRESH_INTERVAL", 0))
+        self.full_interval = float(
+            app.config.get("TRANSLATION_CACHE_FULL_REFRESH_INTERVAL", 3600)
+        )
+        self.refresher = None
 
-    def get_unit(self, lang: str, unit: str) -> typing.Dict[str, str]:
-        print(self.translations["en"])
-        if lang in self.langs:
-            unit = self.translations[lang].get(unit, None)
-        else:
-            return self.translations[self.default].get(unit, None)
+    def get_unit(self, lang: str, unit: str) -> typing.Optional[str]:
+        lang = str(lang)
+        if lang not in self.langs:
+            lang = self.default
+        value = self.translations[lang].get(unit, None)
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value
 
-    async def refresh(self):
-        """Refreshes translation unit cache from database"""
+    async def refresh(self, full: bool = False):
+        """Refreshes translation unit cache from database
+
+        All languages are loaded with a single query. After the first (full)
+        refresh only rows with a version newer than the last seen one are
+        fetched, including the last ``TRANSLATION_CACHE_VERSION_MARGIN``
+        versions (which may have committed late). Every changed language gets a
+        new immutable mapping that is swapped in at once, so readers never see
+        a half built dict. Deleted units are only dropped by a full refresh (or
+        by LISTEN, see :meth:`listen`).
+
+        Args:
+            full (bool, optional): Reload all units. Defaults to False.
+        """
+        from . import db
         from .models import TranslationUnits
 
-        for lang in self.langs:
-            units = await TranslationUnits.query.where(
-                TranslationUnits.lang == lang
-            ).gino.all()
-            for unit in units:
-                if self.translations[lang] is None:
-                    self.translations[lang] = {}
-                if unit.translation is None:
-                    self.translations[lang][unit.unit] = unit.default
-                else:
-                    self.translations[lang][unit.unit] = unit.translation
+        started, full = perf_counter(), full or self.version is None
+        query = db.select(
+            [
+                TranslationUnits.lang,
+                TranslationUnits.unit,
+                TranslationUnits.version,
+                db.func.coalesce(
+                    TranslationUnits.translation, TranslationUnits.default
+                ),
+            ]
+        ).where(TranslationUnits.lang.in_(self.langs))
+        if not full:
+            query = query.where(TranslationUnits.version > self.version - self.margin)
+        # Changes announced by NOTIFY are read from the primary (refresh_unit)
+        with db.use_replica():
+            rows = await query.gino.all()
+
+        changes = {lang: {} for lang in self.langs}
+        version, changed_rows = self.version, 0
+        for lang, unit, row_version, value in rows:
+            # Rows of the margin are mostly unchanged
+            if full or self.translations[lang].get(unit, None) != value:
+                changes[lang][unit] = value
+                changed_rows += 1
+            if version is None or row_version > version:
+                version = row_version
+
+        for lang, changed in changes.items():
+            if full:
+                self.translations[lang] = MappingProxyType(changed)
+            elif changed:
+                self.translations[lang] = MappingProxyType(
+                    {**self.translations[lang], **changed}
+                )
+        self.version = version
+        if full or changed_rows:
+            self.revision += 1
+
+        duration = perf_counter() - started
+        self.stats.update(duration=duration, rows=len(rows))
+        self.stats["refreshes"] += 1
+        metrics = getattr(self.app, "metrics", None)
+        if metrics is not None:
+            metrics.observe("basho_translation_cache_refresh_seconds", (), duration)
+        self.app.logger.info(
+            "Translation cache refreshed (%s): %d rows in %.2f ms, version %s",
+            "full" if full else "incremental",
+            len(rows),
+            duration * 1000,
+            version,
+        )
+
+    def start(self):
+        """Starts periodic refreshes (``TRANSLATION_CACHE_REFRESH_INTERVAL``)"""
+        if self.interval > 0:
+            self.refresher = asyncio.ensure_future(self.refresh_periodically())
+
+    async def stop(self):
+        if self.refresher is not None:
+            self.refresher.cancel()
+            self.refresher = None
+
+    async def refresh_periodically(self):
+        last_full = monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            full = monotonic() - last_full >= self.full_interval
+            try:
+                await self.refresh(full=full)
+            except Exception:
+                self.app.logger.exception("Refreshing translation cache failed")
+                continue
+            if full:
+                last_full = monotonic()
+
+    def listen(self, listener: Listener):
+        """Subscribes to unit changes (LISTEN) emitted by the translationunits trigger
+
+        Changes missed while the LISTEN connection was down are picked up by a
+        full refresh after reconnecting.
+        """
+        listener.subscribe(
+            self.channel, self._on_notify, partial(self.refresh, full=True)
+        )
+
+    def _on_notify(self, payload: str) -> typing.Coroutine:
+        change = loads(payload)
+        return self.refresh_unit(change["unit"], change["lang"])
+
+    async def refresh_unit(self, unit: str, lang: str):
+        """Reloads a single (unit, lang) entry in place"""
+        from . import db
+        from .models import TranslationUnits
+
+        if lang not in self.langs:
+            return
+        value = (
+            await db.select([TranslationUnits.translation, TranslationUnits.default])
+            .where(TranslationUnits.unit == unit)
+            .where(TranslationUnits.lang == lang)
+            .gino.first()
+        )
+        translations = dict(self.translations[lang])
+        if value is None:
+            translations.pop(unit, None)
+        else:
+            translation, default = value
+            translations[unit] = default if translation is None else translation
+        self.translations[lang] = MappingProxyType(translations)
+        self.revision += 1
+
+
+class RoleCache:
+    """TTL'd LRU cache of user roles, keyed by user id
+
+    Missing users are loaded in one batched query (:meth:`Role.get_for_users`).
+    Entries are invalidated by :meth:`User.assign_role`/ :meth:`User.remove_role`
+    and, with ``ROLE_CACHE_LISTEN`` enabled, by the userroles NOTIFY trigger.
+    """
+
+    channel = "userroles"
+
+    def __init__(self, app: Quart):
+        self.app, self.entries = app, OrderedDict()
+        self.ttl = float(app.config.get("ROLE_CACHE_TTL", 60))
+        self.size = int(app.config.get("ROLE_CACHE_SIZE", 10000))
+        self.generation = 0
+
+    async def get(self, user_id: int) -> list:
+        return (await self.get_many([user_id]))[user_id]
+
+    async def get_many(self, user_ids: typing.Iterable[int]) -> typing.Dict[int, list]:
+        """Gets roles of many users, loading all cache misses in one query"""
+        from . import db
+        from .models import Role
+
+        now, roles, missing = monotonic(), dict(), list()
+        for user_id in user_ids:
+            entry = self.entries.get(user_id, None)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(user_id)
+                roles[user_id] = entry[1]
+            else:
+                missing.append(user_id)
+
+        if missing:
+            generation = self.generation
+            # Entries may have just been invalidated by a NOTIFY, a lagging
+            # replica would put the old roles back into the cache
+            with db.use_primary():
+                loaded = await Role.get_for_users(missing)
+            roles.update(loaded)
+            # Don't store results that were invalidated while loading
+            if generation == self.generation:
+                for user_id, user_roles in loaded.items():
+                    self.entries[user_id] = (now + self.ttl, user_roles)
+                    self.entries.move_to_end(user_id)
+                while len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+        return roles
+
+    def invalidate(self, user_id: typing.Optional[int] = None) -> None:
+        """Drops cached roles of a user (or of all users)"""
+        self.generation += 1
+        if user_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(user_id, None)
+
+    def listen(self, listener: Listener):
+        """Subscribes to userroles changes (LISTEN) of other workers
+
+        Notifications missed while the connection was down may have changed
+        any user's roles, so all entries are dropped after a reconnect.
+        """
+        listener.subscribe(self.channel, self._on_notify, self._on_reconnect)
+
+    def _on_notify(self, payload: str):
+        self.invalidate(int(payload) if payload else None)
+
+    async def _on_reconnect(self):
+        self.invalidate()
@@ -0,0 +1,159 @@
+__doc__ = """
+iCalendar feeds of room reservations (``/rooms/<id>/calendar.ics``).
+
+Calendar clients poll their subscriptions often, while reservations of a room
+rarely change. Every room carries ``reservations_modified`` (moved forward by
+a trigger on any change of its reservations), which is all that is needed to
+answer a poll with ``304 Not Modified``. Changed feeds are assembled from
+VEVENT blocks cached per reservation and its ``modified`` stamp, so only new
+or updated reservations are serialized again.
+"""
+
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from hashlib import sha1
+from quart import Quart, Response, request, abort
+from werkzeug.http import http_date, parse_date, parse_etags
+
+PRODID = "-//Basho//Room calendar//EN"
+FORMAT_VERSION = 2  # Bump when the rendering changes, invalidates ETags
+
+
+def escape(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line: str) -> str:
+    """Folds a content line into chunks of at most 75 octets (RFC 5545 3.1)"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Don't split multi byte characters
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode("utf-8"))
+        start, limit = end, 74
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def format_utc(value: datetime) -> str:
+    # Reservation times (see schemas.naive_utc) and stamps (timezone('utc', ...))
+    # are stored as naive UTC
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+class CalendarFeeds:
+    def __init__(self, app: Quart):
+        self.app, self.events = app, OrderedDict()
+        self.size = int(app.config.get("CALENDAR_CACHE_SIZE", 50000))
+        self.past_days = int(app.config.get("CALENDAR_PAST_DAYS", 30))
+        self.host = app.config.get("CALENDAR_UID_HOST", "basho")
+        self.hits = self.misses = 0
+
+    def render_event(self, row: tuple) -> str:
+        """Serializes a reservation tuple (see Reservation.get_calendar_query)"""
+        id, start, end, modified, is_public, meta = row
+        meta = meta if isinstance(meta, dict) else {}
+        if is_public:
+            summary, access = str(meta.get("title", "Reserved")), "PUBLIC"
+        else:
+            summary, access = "Reserved", "PRIVATE"
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:reservation-{id}@{self.host}",
+            f"DTSTAMP:{format_utc(modified)}",
+            f"LAST-MODIFIED:{format_utc(modified)}",
+            f"DTSTART:{format_utc(start)}",
+            f"DTEND:{format_utc(end)}",
+            f"SUMMARY:{escape(summary)}",
+            f"CLASS:{access}",
+        ]
+        if is_public and meta.get("description"):
+            lines.append(f"DESCRIPTION:{escape(str(meta['description']))}")
+        lines.append("END:VEVENT")
+        return "".join(fold(line) for line in lines)
+
+    def event(self, row: tuple) -> str:
+        """Cached VEVENT of a reservation, rendered again once it was modified"""
+        id, modified = row[0], row[3]
+        cached = self.events.get(id, None)
+        if cached is not None and cached[0] == modified:
+            self.hits += 1
+            self.events.move_to_end(id)
+            return cached[1]
+        self.misses += 1
+        event = self.render_event(row)
+        self.events[id] = (modified, event)
+        self.events.move_to_end(id)
+        while len(self.events) > self.size:
+            self.events.popitem(last=False)
+        return event
+
+    def unchanged(self, etag: str, modified: datetime) -> bool:
+        """Whether the client's copy (conditional request headers) is current"""
+        # If-None-Match takes precedence over If-Modified-Since (RFC 7232 6)
+        if "If-None-Match" in request.headers:
+            return etag in parse_etags(request.headers["If-None-Match"])
+        since = parse_date(request.headers.get("If-Modified-Since", None))
+        return since is not None and (
+            modified.replace(microsecond=0) <= since.replace(tzinfo=None)
+        )
+
+    async def respond(self, room_id: int) -> Response:
+        """Feed of a room's reservations (ending at most CALENDAR_PAST_DAYS ago)
+
+        Raises:
+            NotFound: if the room does not exist
+        """
+        from . import db
+        from .models import Room, Reservation
+
+        # Stamp and reservations from one snapshot (of one replica), a stale
+        # body must never be sent with a newer ETag
+        horizon = date.today() - timedelta(days=self.past_days)
+        engine = db.bind.route(Room.get_calendar_stamp_query)
+        async with engine.acquire(reuse=False) as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                stamp = await conn.first(Room.get_calendar_stamp_query, id=room_id)
+                if stamp is None:
+                    abort(404)
+                nick, modified = stamp
+                etag = sha1(
+                    f"{FORMAT_VERSION}:{room_id}:{modified.isoformat()}:{horizon}".encode()
+                ).hexdigest()
+                rows = None
+                if not self.unchanged(etag, modified):
+                    rows = await conn.all(
+                        Reservation.get_calendar_query,
+                        room_id=room_id,
+                        horizon=datetime.combine(horizon, datetime.min.time()),
+                    )
+
+        if rows is None:
+            response = Response("", status=304)
+        else:
+            body = "".join(
+                [
+                    "BEGIN:VCALENDAR\r\n",
+                    "VERSION:2.0\r\n",
+                    f"PRODID:{PRODID}\r\n",
+                    "CALSCALE:GREGORIAN\r\n",
+                    fold(f"X-WR-CALNAME:{escape(nick or str(room_id))}"),
+                ]
+                + [self.event(row) for row in rows]
+                + ["END:VCALENDAR\r\n"]
+            )
+            response = Response(body, content_type="text/calendar; charset=utf-8")
+        response.headers["ETag"] = f'"{etag}"'
+        response.headers["Last-Modified"] = http_date(modified)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
@@ -0,0 +1,251 @@
+__doc__ = """
+HTTP load tests (``toolkit.py benchmark-http`` and ``benchmark-compare``).
+
+Every scenario is driven by a number of concurrent virtual users for a fixed
+time, either in-process through the ASGI test client or over HTTP/1.1
+keep-alive connections (h11) against a running server. Paths are built from
+rows sampled from the database (rooms, units, users seeded by
+``toolkit.py generate-data``). Results are plain JSON, two result files can be
+compared to flag regressions.
+"""
+
+import asyncio
+import typing
+from collections import Counter
+from math import ceil
+from random import Random
+from time import perf_counter
+from urllib.parse import urlencode, urlsplit
+
+# name: (method, expected status codes, build(rng, samples) -> (path, form))
+SCENARIOS = {
+    "index": ("GET", (200,), lambda rng, samples: ("/", None)),
+    "rooms": (
+        "GET",
+        (200,),
+        lambda rng, samples: (f"/rooms/{rng.choice(samples['cursors'])}", None),
+    ),
+    "users": ("GET", (200,), lambda rng, samples: ("/users", None)),
+    "login": (
+        "POST",
+        (302,),
+        lambda rng, samples: (
+            "/user/login",
+            dict(
+                username=rng.choice(samples["usernames"]), password=samples["password"]
+            ),
+        ),
+    ),
+    "unit-edit": (
+        "GET",
+        (200,),
+        lambda rng, samples: (
+            f"/admin/units/edit/{rng.choice(samples['units'])}",
+            None,
+        ),
+    ),
+}
+# Compared metrics, higher is better for rps, lower for everything else
+COMPARED = ("rps", "p50", "p95", "p99", "error_rate")
+
+
+async def sample(password: str, size: int = 200) -> dict:
+    """Loads rows to build request paths from (requires a bound db)"""
+    from . import db
+    from .helper import encode_cursor
+
+    rooms = await db.all(
+        db.text("SELECT nick, id FROM rooms ORDER BY random() LIMIT :size"), size=size
+    )
+    units = await db.all(
+        db.text("SELECT DISTINCT unit FROM translationunits LIMIT :size"), size=size
+    )
+    usernames = await db.all(
+        db.text(
+            "SELECT username FROM users WHERE NOT is_suspended ORDER BY id LIMIT :size"
+        ),
+        size=size,
+    )
+    sizes = await db.all(
+        db.text(
+            "SELECT relname, reltuples::bigint FROM pg_class WHERE relname IN "
+            "('users', 'roles', 'userroles', 'rooms', 'reservations', "
+            "'translationunits')"
+        )
+    )
+    return dict(
+        cursors=[encode_cursor(nick, id) for nick, id in rooms] or [""],
+        units=[unit for unit, in units] or ["none"],
+        usernames=[username for username, in usernames] or ["none"],
+        password=password,
+        sizes={name: count for name, count in sizes},
+    )
+
+
+class InProcessClient:
+    """Runs requests in-process through the quart test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    async def request(self, method: str, path: str, form: typing.Optional[dict]):
+        if form is None:
+            response = await self.client.open(path, method=method)
+        else:
+            response = await self.client.open(path, method=method, form=form)
+        await response.get_data(raw=True)
+        return response.status_code
+
+    async def close(self):
+        pass
+
+
+class HttpClient:
+    """Minimal HTTP/1.1 keep-alive client on top of h11"""
+
+    def __init__(self, url: str):
+        url = urlsplit(url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.reader = self.writer = self.connection = None
+
+    async def request(self, method: str, path: str, form: typing.Optional[dict]):
+        import h11
+
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+            self.connection = h11.Connection(our_role=h11.CLIENT)
+        body = urlencode(form).encode() if form is not None else b""
+        headers = [("Host", self.host), ("Content-Length", str(len(body)))]
+        if form is not None:
+            headers.append(("Content-Type", "application/x-www-form-urlencoded"))
+        for event in (
+            h11.Request(method=method, target=path, headers=headers),
+            h11.Data(data=body),
+            h11.EndOfMessage(),
+        ):
+            self.writer.write(self.connection.send(event))
+        await self.writer.drain()
+
+        status = None
+        while True:
+            event = self.connection.next_event()
+            if event is h11.NEED_DATA:
+                self.connection.receive_data(await self.reader.read(65536))
+            elif isinstance(event, h11.Response):
+                status = event.status_code
+            elif isinstance(event, (h11.EndOfMessage, h11.ConnectionClosed)):
+                break
+        if self.connection.our_state is h11.DONE and (
+            self.connection.their_state is h11.DONE
+        ):
+            self.connection.start_next_cycle()
+        else:
+            await self.close()
+        return status
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = self.connection = None
+
+
+def percentile(values: typing.List[float], q: float) -> float:
+    """Nearest rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, ceil(q * len(values)) - 1))]
+
+
+def summarize(
+    latencies: typing.List[float], statuses: Counter, elapsed: float, expected: tuple
+) -> dict:
+    latencies = sorted(latencies)
+    errors = sum(count for status, count in statuses.items() if status not in expected)
+    requests = len(latencies)
+    return dict(
+        requests=requests,
+        errors=errors,
+        error_rate=errors / requests if requests else 0.0,
+        rps=requests / elapsed if elapsed else 0.0,
+        mean=sum(latencies) / requests * 1000 if requests else 0.0,
+        p50=percentile(latencies, 0.50) * 1000,
+        p95=percentile(latencies, 0.95) * 1000,
+        p99=percentile(latencies, 0.99) * 1000,
+        statuses={str(status): count for status, count in sorted(statuses.items())},
+    )
+
+
+async def run_scenario(
+    name: str,
+    client_factory: typing.Callable,
+    samples: dict,
+    concurrency: int,
+    duration: float,
+    warmup: float = 0.0,
+) -> dict:
+    """Drives scenario name with concurrent clients for duration seconds"""
+    method, expected, build = SCENARIOS[name]
+    latencies, statuses = [], Counter()
+
+    async def virtual_user(index: int, until: float, record: bool):
+        client, rng = client_factory(), Random(f"{name}-{index}")
+        try:
+            while perf_counter() < until:
+                path, form = build(rng, samples)
+                started = perf_counter()
+                try:
+                    status = await client.request(method, path, form)
+                except Exception:
+                    status = 0  # Connection error (or error raised in-process)
+                    await client.close()
+                if record:
+                    latencies.append(perf_counter() - started)
+                    statuses[status] += 1
+        finally:
+            await client.close()
+
+    if warmup:
+        until = perf_counter() + warmup
+        await asyncio.gather(
+            *[virtual_user(i, until, False) for i in range(concurrency)]
+        )
+    started = perf_counter()
+    until = started + duration
+    await asyncio.gather(*[virtual_user(i, until, True) for i in range(concurrency)])
+    return summarize(latencies, statuses, perf_counter() - started, expected)
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> typing.List[dict]:
+    """Lists metrics of candidate that got worse than baseline by > threshold %
+
+    Error rates are compared in percentage points, everything else relative to
+    the baseline value.
+    """
+    regressions = []
+    for name, before in baseline["scenarios"].items():
+        after = candidate["scenarios"].get(name, None)
+        if after is None:
+            continue
+        for metric in COMPARED:
+            old, new = before[metric], after[metric]
+            if metric == "error_rate":
+                change = (new - old) * 100
+            elif old:
+                change = (new - old) / old * 100
+            else:
+                continue
+            if metric == "rps":
+                change = -change
+            if change > threshold:
+                regressions.append(
+                    dict(
+                        scenario=name,
+                        metric=metric,
+                        baseline=old,
+                        candidate=new,
+                        change=round(change, 1),
+                    )
+                )
+    return regressions
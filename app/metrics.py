@@ -0,0 +1,274 @@
+__doc__ = """
+Prometheus metrics (text format) served at ``/metrics``.
+
+Every worker keeps plain counters and histograms in memory; observations are
+a dict lookup, a bisect and a few additions. With ``METRICS_DIR`` set, workers
+write snapshots of their metrics to that directory and ``/metrics`` merges the
+snapshots of all workers, so scrapes are consistent no matter which worker
+answers them.
+"""
+
+import asyncio
+import typing
+from bisect import bisect_left
+from glob import glob
+from os import getpid, path, remove, replace
+from time import perf_counter, time
+from ujson import dump, load
+from quart import Quart, Response, request
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+HELP = {
+    "basho_request_duration_seconds": ("histogram", "Request latency by route"),
+    "basho_query_duration_seconds": ("histogram", "Baked query latency"),
+    "basho_query_rows_total": ("counter", "Rows returned by baked queries"),
+    "basho_request_connections_total": (
+        "counter",
+        "Request connections acquired, used and skipped",
+    ),
+    "basho_translation_cache_requests_total": (
+        "counter",
+        "Translation cache lookups by result",
+    ),
+    "basho_translation_cache_refresh_seconds": (
+        "histogram",
+        "Translation cache refresh duration",
+    ),
+    "basho_event_loop_lag_seconds": ("histogram", "Event loop scheduling lag"),
+    "basho_db_pool_connections": ("gauge", "Pool connections by state"),
+    "basho_db_pool_waiters": ("gauge", "Coroutines waiting for a pool connection"),
+}
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: typing.Sequence[float]):
+        self.buckets, self.counts, self.sum = buckets, [0] * (len(buckets) + 1), 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    def __init__(self, app: Quart, db):
+        self.app, self.db = app, db
+        self.histograms, self.counters = dict(), dict()
+        self.directory = app.config.get("METRICS_DIR", None)
+        self.interval = float(app.config.get("METRICS_INTERVAL", 5))
+        self.tasks = []
+
+        @app.before_request
+        async def start_timer():
+            request.started = perf_counter()
+
+        @app.after_request
+        async def observe_request(response):
+            started = getattr(request, "started", None)
+            if started is not None:
+                labels = (
+                    ("endpoint", request.endpoint or "none"),
+                    ("method", request.method),
+                    ("status", str(response.status_code)),
+                )
+                self.observe(
+                    "basho_request_duration_seconds",
+                    labels,
+                    perf_counter() - started,
+                )
+            return response
+
+        @app.before_serving
+        async def start_metrics():
+            self.name_baked_queries()
+            self.db.bind.connection_cls.observers.append(self.observe_query)
+            self.tasks.append(asyncio.ensure_future(self.measure_lag()))
+            if self.directory is not None:
+                self.tasks.append(asyncio.ensure_future(self.write_periodically()))
+
+        @app.after_serving
+        async def stop_metrics():
+            for task in self.tasks:
+                task.cancel()
+            if self.directory is not None and path.isfile(self.snapshot_path):
+                remove(self.snapshot_path)
+
+        app.add_url_rule("/metrics", "metrics", db.no_connection(self.endpoint))
+
+    def observe(
+        self,
+        name: str,
+        labels: tuple,
+        value: float,
+        buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        histogram = self.histograms.get((name, labels), None)
+        if histogram is None:
+            histogram = self.histograms[(name, labels)] = Histogram(buckets)
+        histogram.observe(value)
+
+    def inc(self, name: str, labels: tuple, value: float = 1) -> None:
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def name_baked_queries(self) -> None:
+        """Labels every baked query with ``<Model>.<attribute>``"""
+        from gino.bakery import BakedQuery
+
+        models = list(self.db.Model.__subclasses__())
+        for model in models:
+            models.extend(model.__subclasses__())
+            for name, value in vars(model).items():
+                if isinstance(value, BakedQuery):
+                    value.metrics_name = f"{model.__name__}.{name}"
+
+    def observe_query(self, connection, clause, multiparams, params, duration, rows):
+        name = getattr(clause, "metrics_name", None)
+        if name is not None:
+            labels = (("query", name),)
+            self.observe("basho_query_duration_seconds", labels, duration)
+            self.inc("basho_query_rows_total", labels, rows)
+
+    async def measure_lag(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(0.5)
+            self.observe(
+                "basho_event_loop_lag_seconds",
+                (),
+                loop.time() - started - 0.5,
+                LAG_BUCKETS,
+            )
+
+    def gauges(self) -> dict:
+        """Collects current pool state (asyncpg pool internals, best effort)"""
+        worker, gauges = (("worker", str(getpid())),), dict()
+        pool = getattr(self.db.bind, "raw_pool", None)
+        holders = getattr(pool, "_holders", None)
+        if holders is not None:
+            connected = [holder for holder in holders if holder._con is not None]
+            in_use = sum(1 for holder in connected if holder._in_use is not None)
+            gauges[("basho_db_pool_connections", worker + (("state", "in_use"),))] = (
+                in_use
+            )
+            gauges[("basho_db_pool_connections", worker + (("state", "idle"),))] = (
+                len(connected) - in_use
+            )
+            gauges[("basho_db_pool_waiters", worker)] = len(
+                getattr(pool._queue, "_getters", ())
+            )
+        return gauges
+
+    def collect_counters(self) -> dict:
+        counters = dict(self.counters)
+        for state, count in self.db.request_stats.items():
+            counters[("basho_request_connections_total", (("state", state),))] = count
+        translations = getattr(self.app, "translations", None)
+        if translations is not None:
+            for result in ("hit", "miss"):
+                counters[
+                    ("basho_translation_cache_requests_total", (("result", result),))
+                ] = translations.stats[f"{result}s"]
+        return counters
+
+    def snapshot(self) -> dict:
+        return dict(
+            time=time(),
+            histograms=[
+                [name, labels, histogram.buckets, histogram.counts, histogram.sum]
+                for (name, labels), histogram in self.histograms.items()
+            ],
+            counters=[
+                [name, labels, value]
+                for (name, labels), value in self.collect_counters().items()
+            ],
+            gauges=[
+                [name, labels, value] for (name, labels), value in self.gauges().items()
+            ],
+        )
+
+    @property
+    def snapshot_path(self) -> str:
+        return path.join(self.directory, f"{getpid()}.json")
+
+    def write_snapshot(self) -> None:
+        temporary = self.snapshot_path + ".tmp"
+        with open(temporary, "w") as f:
+            dump(self.snapshot(), f)
+        replace(temporary, self.snapshot_path)
+
+    async def write_periodically(self):
+        while True:
+            self.write_snapshot()
+            await asyncio.sleep(self.interval)
+
+    def snapshots(self) -> list:
+        if self.directory is None:
+            return [self.snapshot()]
+        self.write_snapshot()
+        snapshots = []
+        for filename in glob(path.join(self.directory, "*.json")):
+            try:
+                with open(filename, "r") as f:
+                    snapshot = load(f)
+            except (OSError, ValueError):
+                continue
+            # Skip workers that stopped without cleaning up
+            if snapshot["time"] > time() - self.interval * 3:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def export(self) -> str:
+        """Merges snapshots of all workers into prometheus text format"""
+        histograms, counters, gauges = dict(), dict(), dict()
+        for snapshot in self.snapshots():
+            for name, labels, buckets, counts, total in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)), tuple(buckets))
+                merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, value in snapshot["gauges"]:
+                gauges[(name, tuple(map(tuple, labels)))] = value
+
+        lines, described = [], set()
+
+        def describe(name: str):
+            if name not in described:
+                described.add(name)
+                kind, text = HELP.get(name, ("untyped", name))
+                lines.extend([f"# HELP {name} {text}", f"# TYPE {name} {kind}"])
+
+        for (name, labels, buckets), (counts, total) in sorted(histograms.items()):
+            describe(name)
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += count
+                le = labels + (("le", str(bound)),)
+                lines.append(f"{name}_bucket{format_labels(le)} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        for values in (counters, gauges):
+            for (name, labels), value in sorted(values.items()):
+                describe(name)
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def endpoint(self) -> Response:
+        return Response(self.export(), mimetype="text/plain; version=0.0.4")
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return "{" + pairs + "}"
@@ -0,0 +1,67 @@
+"""Change meta columns to JSONB
+
+Revision ID: 2e6d4b8f9a13
+Revises: a7c3e91f5d28
+Create Date: 2026-10-17 21:04:51.377160
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "2e6d4b8f9a13"
+down_revision = "a7c3e91f5d28"
+branch_labels = None
+depends_on = None
+
+TABLES = ("users", "rooms", "reservations")
+# Numeric room meta keys, generate-data stored floor as string ("2")
+NUMERIC_ROOM_KEYS = ("capacity", "floor")
+
+
+def upgrade():
+    for table in TABLES:
+        op.alter_column(
+            table,
+            "meta",
+            type_=postgresql.JSONB(),
+            existing_type=sa.JSON(),
+            postgresql_using="meta::jsonb",
+        )
+    # JSONB matching is type strict (2 doesn't match "2", range filters only
+    # compare numbers), so numeric strings are stored as numbers
+    for key in NUMERIC_ROOM_KEYS:
+        op.execute(
+            f"""
+            UPDATE rooms
+            SET meta = meta || jsonb_build_object('{key}', (meta ->> '{key}')::numeric)
+            WHERE jsonb_typeof(meta -> '{key}') = 'string'
+            AND meta ->> '{key}' ~ '^-?[0-9]+(\\.[0-9]+)?$'
+            """
+        )
+    # Containment (Room.filter_by_meta), only rooms meta is filtered on
+    op.create_index(
+        "ix_rooms_meta",
+        "rooms",
+        ["meta"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"meta": "jsonb_path_ops"},
+    )
+    # Range filters on capacity, jsonb_path_ops only answers containment
+    op.execute("CREATE INDEX ix_rooms_meta_capacity ON rooms ((meta -> 'capacity'))")
+
+
+def downgrade():
+    op.drop_index("ix_rooms_meta_capacity", table_name="rooms")
+    op.drop_index("ix_rooms_meta", table_name="rooms")
+    for table in reversed(TABLES):
+        op.alter_column(
+            table,
+            "meta",
+            type_=sa.JSON(),
+            existing_type=postgresql.JSONB(),
+            postgresql_using="meta::json",
+        )
@@ -0,0 +1,33 @@
+"""Add Reservations overlap exclusion
+
+Revision ID: 3b7d0e5c2a91
+Revises: 96cefb27169f
+Create Date: 2026-10-17 09:12:44.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3b7d0e5c2a91"
+down_revision = "96cefb27169f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # btree_gist provides the gist operator class for room_id WITH =
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    op.create_check_constraint(
+        "reservations_start_before_end", "reservations", 'start < "end"'
+    )
+    op.execute(
+        "ALTER TABLE reservations ADD CONSTRAINT reservations_room_id_during_excl "
+        'EXCLUDE USING gist (room_id WITH =, tsrange(start, "end") WITH &&)'
+    )
+
+
+def downgrade():
+    op.drop_constraint("reservations_room_id_during_excl", "reservations")
+    op.drop_constraint("reservations_start_before_end", "reservations")
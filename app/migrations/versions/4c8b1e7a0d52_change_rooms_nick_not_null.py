@@ -0,0 +1,27 @@
+"""Change Rooms nick to NOT NULL
+
+Revision ID: 4c8b1e7a0d52
+Revises: 2e6d4b8f9a13
+Create Date: 2026-10-18 09:12:40.218337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "4c8b1e7a0d52"
+down_revision = "2e6d4b8f9a13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (nick, id) < (NULL, id) is NULL, keyset pagination would stop at rooms
+    # without nick
+    op.execute("UPDATE rooms SET nick = 'room-' || id WHERE nick IS NULL")
+    op.alter_column("rooms", "nick", existing_type=sa.String(length=90), nullable=False)
+
+
+def downgrade():
+    op.alter_column("rooms", "nick", existing_type=sa.String(length=90), nullable=True)
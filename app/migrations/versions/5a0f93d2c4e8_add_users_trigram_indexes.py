@@ -0,0 +1,41 @@
+"""Add Users trigram indexes
+
+Revision ID: 5a0f93d2c4e8
+Revises: e84c1f6d07b2
+Create Date: 2026-10-17 10:47:19.104532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5a0f93d2c4e8"
+down_revision = "e84c1f6d07b2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_users_username_trgm",
+        "users",
+        ["username"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"username": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "ix_users_e_mail_trgm",
+        "users",
+        ["e_mail"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"e_mail": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    op.drop_index("ix_users_e_mail_trgm", table_name="users")
+    op.drop_index("ix_users_username_trgm", table_name="users")
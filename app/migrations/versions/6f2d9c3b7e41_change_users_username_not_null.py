@@ -0,0 +1,30 @@
+"""Change Users username to NOT NULL
+
+Revision ID: 6f2d9c3b7e41
+Revises: 4c8b1e7a0d52
+Create Date: 2026-10-18 09:31:05.640219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "6f2d9c3b7e41"
+down_revision = "4c8b1e7a0d52"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same as rooms.nick, the user search pages on (username, id)
+    op.execute("UPDATE users SET username = 'user-' || id WHERE username IS NULL")
+    op.alter_column(
+        "users", "username", existing_type=sa.String(length=90), nullable=False
+    )
+
+
+def downgrade():
+    op.alter_column(
+        "users", "username", existing_type=sa.String(length=90), nullable=True
+    )
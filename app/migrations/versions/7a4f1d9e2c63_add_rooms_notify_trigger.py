@@ -0,0 +1,44 @@
+"""Add Rooms notify trigger
+
+Revision ID: 7a4f1d9e2c63
+Revises: 6f2d9c3b7e41
+Create Date: 2026-10-17 18:21:09.413205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7a4f1d9e2c63"
+down_revision = "6f2d9c3b7e41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bumps the "rooms" page cache version of every worker (PageCache.listen)
+    # reservations_modified is left out, it changes with every reservation
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_rooms() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('rooms', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER rooms_notify
+        AFTER INSERT OR DELETE OR TRUNCATE
+        OR UPDATE OF nick, description, meta, master_id ON rooms
+        FOR EACH STATEMENT EXECUTE PROCEDURE notify_rooms()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER rooms_notify ON rooms")
+    op.execute("DROP FUNCTION notify_rooms()")
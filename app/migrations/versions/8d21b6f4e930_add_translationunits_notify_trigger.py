@@ -0,0 +1,58 @@
+"""Add Translationunits notify trigger
+
+Revision ID: 8d21b6f4e930
+Revises: 5a0f93d2c4e8
+Create Date: 2026-10-17 11:26:07.830915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8d21b6f4e930"
+down_revision = "5a0f93d2c4e8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Payload matches TranslationCache._on_notify in app/helper.py
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_translationunits() RETURNS trigger AS $$
+        DECLARE
+            changed translationunits;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed := OLD;
+            ELSE
+                changed := NEW;
+            END IF;
+            PERFORM pg_notify(
+                'translationunits',
+                json_build_object('unit', changed.unit, 'lang', changed.lang)::text
+            );
+            IF TG_OP = 'UPDATE' AND (OLD.unit, OLD.lang) <> (NEW.unit, NEW.lang) THEN
+                PERFORM pg_notify(
+                    'translationunits',
+                    json_build_object('unit', OLD.unit, 'lang', OLD.lang)::text
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER translationunits_notify
+        AFTER INSERT OR UPDATE OR DELETE ON translationunits
+        FOR EACH ROW EXECUTE PROCEDURE notify_translationunits()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER translationunits_notify ON translationunits")
+    op.execute("DROP FUNCTION notify_translationunits()")
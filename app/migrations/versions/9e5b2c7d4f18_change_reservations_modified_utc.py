@@ -0,0 +1,109 @@
+"""Change Reservations modified to UTC
+
+Revision ID: 9e5b2c7d4f18
+Revises: 7a4f1d9e2c63
+Create Date: 2026-10-17 19:03:47.215830
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9e5b2c7d4f18"
+down_revision = "7a4f1d9e2c63"
+branch_labels = None
+depends_on = None
+
+STAMPS = (("reservations", "modified"), ("rooms", "reservations_modified"))
+
+
+def convert(expression: str):
+    # USER triggers would touch the stamps again while they are converted
+    for table, column in STAMPS:
+        op.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER")
+        op.execute(f"UPDATE {table} SET {column} = {expression.format(column)}")
+        op.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER")
+
+
+def upgrade():
+    # Stamps were local time of the server's TimeZone, calendar feeds send UTC
+    convert("({} AT TIME ZONE current_setting('TimeZone')) AT TIME ZONE 'UTC'")
+    for table, column in STAMPS:
+        op.alter_column(table, column, server_default=sa.text("timezone('utc', now())"))
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION touch_reservation() RETURNS trigger AS $$
+        BEGIN
+            NEW.modified := timezone('utc', clock_timestamp());
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # Rooms are locked in id order, statements touching several rooms in
+    # different order would deadlock otherwise. The lock is held until commit,
+    # which keeps the stamp increasing in commit order (a stamp derived from
+    # max(reservations.modified) would miss transactions committing late).
+    # FOR NO KEY UPDATE doesn't block the foreign key checks of other bookings.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION touch_room_reservations() RETURNS trigger AS $$
+        DECLARE
+            room_ids integer[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                room_ids := ARRAY(SELECT DISTINCT room_id FROM new_rows);
+            ELSIF TG_OP = 'DELETE' THEN
+                room_ids := ARRAY(SELECT DISTINCT room_id FROM old_rows);
+            ELSE
+                room_ids := ARRAY(
+                    SELECT room_id FROM new_rows UNION SELECT room_id FROM old_rows
+                );
+            END IF;
+            PERFORM 1 FROM rooms WHERE id = ANY(room_ids)
+                ORDER BY id FOR NO KEY UPDATE;
+            UPDATE rooms SET reservations_modified = greatest(
+                timezone('utc', clock_timestamp()),
+                reservations_modified + interval '1 microsecond'
+            ) WHERE id = ANY(room_ids);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION touch_room_reservations() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE rooms SET reservations_modified = greatest(
+                    clock_timestamp(), reservations_modified + interval '1 microsecond'
+                ) WHERE id IN (SELECT room_id FROM new_rows);
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE rooms SET reservations_modified = greatest(
+                    clock_timestamp(), reservations_modified + interval '1 microsecond'
+                ) WHERE id IN (SELECT room_id FROM old_rows);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION touch_reservation() RETURNS trigger AS $$
+        BEGIN
+            NEW.modified := clock_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table, column in STAMPS:
+        op.alter_column(table, column, server_default=sa.text("now()"))
+    convert("({} AT TIME ZONE 'UTC') AT TIME ZONE current_setting('TimeZone')")
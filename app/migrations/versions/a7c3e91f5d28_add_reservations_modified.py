@@ -0,0 +1,105 @@
+"""Add Reservations modified
+
+Revision ID: a7c3e91f5d28
+Revises: f1b4c8d26e07
+Create Date: 2026-10-17 19:12:08.604417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a7c3e91f5d28"
+down_revision = "f1b4c8d26e07"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "reservations",
+        sa.Column(
+            "modified", sa.DateTime(), server_default=sa.text("now()"), nullable=False
+        ),
+    )
+    op.add_column(
+        "rooms",
+        sa.Column(
+            "reservations_modified",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION touch_reservation() RETURNS trigger AS $$
+        BEGIN
+            NEW.modified := clock_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER reservations_touch
+        BEFORE UPDATE ON reservations
+        FOR EACH ROW EXECUTE PROCEDURE touch_reservation()
+        """
+    )
+    # Statement level, so bulk loads update every room once. The stamp only
+    # moves forward, even if an older transaction commits last (calendar
+    # feeds derive Last-Modified and ETag from it)
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION touch_room_reservations() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE rooms SET reservations_modified = greatest(
+                    clock_timestamp(), reservations_modified + interval '1 microsecond'
+                ) WHERE id IN (SELECT room_id FROM new_rows);
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE rooms SET reservations_modified = greatest(
+                    clock_timestamp(), reservations_modified + interval '1 microsecond'
+                ) WHERE id IN (SELECT room_id FROM old_rows);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER reservations_touch_room_insert
+        AFTER INSERT ON reservations REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE touch_room_reservations()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER reservations_touch_room_update
+        AFTER UPDATE ON reservations
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE touch_room_reservations()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER reservations_touch_room_delete
+        AFTER DELETE ON reservations REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE touch_room_reservations()
+        """
+    )
+
+
+def downgrade():
+    for event in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER reservations_touch_room_{event} ON reservations")
+    op.execute("DROP FUNCTION touch_room_reservations()")
+    op.execute("DROP TRIGGER reservations_touch ON reservations")
+    op.execute("DROP FUNCTION touch_reservation()")
+    op.drop_column("rooms", "reservations_modified")
+    op.drop_column("reservations", "modified")
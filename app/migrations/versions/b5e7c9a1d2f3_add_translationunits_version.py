@@ -0,0 +1,62 @@
+"""Add Translationunits.version
+
+Revision ID: b5e7c9a1d2f3
+Revises: 8d21b6f4e930
+Create Date: 2026-10-17 12:08:42.517386
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b5e7c9a1d2f3"
+down_revision = "8d21b6f4e930"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE SEQUENCE translationunits_version_seq")
+    op.add_column(
+        "translationunits",
+        sa.Column(
+            "version",
+            sa.BigInteger(),
+            nullable=False,
+            server_default=sa.text("nextval('translationunits_version_seq')"),
+        ),
+    )
+    op.execute(
+        "ALTER SEQUENCE translationunits_version_seq OWNED BY translationunits.version"
+    )
+    op.create_index(
+        op.f("ix_translationunits_version"),
+        "translationunits",
+        ["version"],
+        unique=False,
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_translationunits_version() RETURNS trigger AS $$
+        BEGIN
+            NEW.version := nextval('translationunits_version_seq');
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER translationunits_version
+        BEFORE UPDATE ON translationunits
+        FOR EACH ROW EXECUTE PROCEDURE bump_translationunits_version()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER translationunits_version ON translationunits")
+    op.execute("DROP FUNCTION bump_translationunits_version()")
+    op.drop_index(op.f("ix_translationunits_version"), table_name="translationunits")
+    op.drop_column("translationunits", "version")
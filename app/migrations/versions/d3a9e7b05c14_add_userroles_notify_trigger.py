@@ -0,0 +1,47 @@
+"""Add Userroles notify trigger
+
+Revision ID: d3a9e7b05c14
+Revises: c6f2a8e4b1d7
+Create Date: 2026-10-17 14:02:36.774120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d3a9e7b05c14"
+down_revision = "c6f2a8e4b1d7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Payload (user id) matches RoleCache._on_notify in app/helper.py
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_userroles() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                PERFORM pg_notify('userroles', OLD.user_id::text);
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                PERFORM pg_notify('userroles', NEW.user_id::text);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER userroles_notify
+        AFTER INSERT OR UPDATE OR DELETE ON userroles
+        FOR EACH ROW EXECUTE PROCEDURE notify_userroles()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER userroles_notify ON userroles")
+    op.execute("DROP FUNCTION notify_userroles()")
@@ -0,0 +1,32 @@
+"""Add overview keyset indexes
+
+Revision ID: e84c1f6d07b2
+Revises: 3b7d0e5c2a91
+Create Date: 2026-10-17 10:03:51.662470
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e84c1f6d07b2"
+down_revision = "3b7d0e5c2a91"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_rooms_nick_id", "rooms", ["nick", "id"], unique=False)
+    op.create_index(
+        "ix_reservations_public_start_id",
+        "reservations",
+        ["start", "id"],
+        unique=False,
+        postgresql_where=sa.text("is_public"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_reservations_public_start_id", table_name="reservations")
+    op.drop_index("ix_rooms_nick_id", table_name="rooms")
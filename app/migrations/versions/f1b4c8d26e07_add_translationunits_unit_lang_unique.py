@@ -0,0 +1,38 @@
+"""Add Translationunits unit lang unique
+
+Revision ID: f1b4c8d26e07
+Revises: d3a9e7b05c14
+Create Date: 2026-10-17 17:02:41.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f1b4c8d26e07"
+down_revision = "d3a9e7b05c14"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # initial_setup used to insert duplicates, keep the translated (then the
+    # oldest) row of every (unit, lang)
+    op.execute(
+        """
+        DELETE FROM translationunits a
+        USING translationunits b
+        WHERE a.unit = b.unit AND a.lang = b.lang
+        AND (b.translation IS NOT NULL, -b.id) > (a.translation IS NOT NULL, -a.id)
+        """
+    )
+    op.create_unique_constraint(
+        "uq_translationunits_unit_lang", "translationunits", ["unit", "lang"]
+    )
+
+
+def downgrade():
+    op.drop_constraint(
+        "uq_translationunits_unit_lang", "translationunits", type_="unique"
+    )
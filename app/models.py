@@ -1,11 +1,13 @@
 import typing
 from secrets import token_urlsafe
-from hashlib import md5
-from datetime import datetime
+from hashlib import md5, sha256
+from hmac import new as hmac_new, compare_digest
+from datetime import datetime, timedelta
 from ujson import dumps
 from sqlalchemy.sql.sqltypes import Text
 from werkzeug.security import generate_password_hash, check_password_hash
 from . import db, app
+from .helper import encode_cursor, decode_cursor, escape_like, StreamedPage
 
 
 class Role(db.Model):
@@ -22,6 +24,30 @@ class Role(db.Model):
     async def get_by_name(name: str):
         return await Role.get_by_name_query.first(name=name)
 
+    @db.bake
+    def get_for_users_query(self):
+        """Constructs Query for getting (user id, Role) pairs of many users"""
+        query = self.join(UserRoles, UserRoles.role_id == self.id).select()
+        query = query.where(UserRoles.user_id == db.func.any(db.bindparam("uids")))
+        return query.execution_options(loader=(UserRoles.user_id, self))
+
+    @staticmethod
+    async def get_for_users(
+        user_ids: typing.List[int],
+    ) -> typing.Dict[int, typing.List["Role"]]:
+        """Gets roles of many users in a single query
+
+        Args:
+            user_ids (typing.List[int]): ids of users
+
+        Returns:
+            typing.Dict[int, typing.List[Role]]: roles by user id (every id is present)
+        """
+        roles = {user_id: [] for user_id in user_ids}
+        for user_id, role in await Role.get_for_users_query.all(uids=list(roles)):
+            roles[user_id].append(role)
+        return roles
+
     def __repr__(self) -> str:
         return f"<Role {self.name} [{self.id}]>"
 
@@ -41,16 +67,30 @@ class User(db.Model):
     __tablename__ = "users"
 
     id = db.Column(db.Integer, unique=True, primary_key=True)
-    username = db.Column(db.String(90), unique=True)
+    # NOT NULL, (username, id) keyset pagination stops at NULL
+    username = db.Column(db.String(90), unique=True, nullable=False)
     e_mail = db.Column(db.String(128), unique=True)
     gravatar = db.Column(db.Boolean, server_default="0")
     password = db.Column(db.String(158))
-    meta = db.Column(db.JSON)
+    meta = db.Column(db.JSONB)
     token = db.Column(db.String(342), unique=True)
     token_expiration = db.Column(db.DateTime)
     is_superuser = db.Column(db.Boolean, nullable=False, server_default="0")
     is_suspended = db.Column(db.Boolean, nullable=False, server_default="0")
 
+    _username_trgm_idx = db.Index(
+        "ix_users_username_trgm",
+        "username",
+        postgresql_using="gin",
+        postgresql_ops={"username": "gin_trgm_ops"},
+    )
+    _e_mail_trgm_idx = db.Index(
+        "ix_users_e_mail_trgm",
+        "e_mail",
+        postgresql_using="gin",
+        postgresql_ops={"e_mail": "gin_trgm_ops"},
+    )
+
     @property
     def is_authenticated(self) -> bool:
         """Checks if user is suspended
@@ -82,9 +122,19 @@ class User(db.Model):
         """
         return self.username
 
-    async def get_roles(self):
-        """Gets roles of user with baked query"""
-        return await self.get_role_query.all(uid=self.id)
+    async def get_roles(self) -> list:
+        """Gets roles of user through the role cache (see :class:`app.helper.RoleCache`)"""
+        return await app.roles.get(self.id)
+
+    async def assign_role(self, role: Role) -> None:
+        await UserRoles.create(user_id=self.id, role_id=role.id)
+        app.roles.invalidate(self.id)
+
+    async def remove_role(self, role: Role) -> None:
+        await UserRoles.delete.where(UserRoles.user_id == self.id).where(
+            UserRoles.role_id == role.id
+        ).gino.status()
+        app.roles.invalidate(self.id)
 
     @staticmethod
     async def get_by_username(username: str):
@@ -105,6 +155,82 @@ class User(db.Model):
         query = self.query.where(self.username == db.bindparam("username"))
         return query
 
+    @db.bake
+    def search_first_query(self):
+        """Constructs Query for the first page of a username/ e-mail search"""
+        pattern = db.bindparam("pattern")
+        query = self.query.where(
+            db.or_(self.username.ilike(pattern), self.e_mail.ilike(pattern))
+        )
+        return query.order_by(self.username, self.id).limit(db.bindparam("limit"))
+
+    @db.bake
+    def search_query(self):
+        """Constructs keyset Query for a username/ e-mail search after (username, id)"""
+        pattern = db.bindparam("pattern")
+        after = db.tuple_(db.bindparam("username"), db.bindparam("id"))
+        query = self.query.where(
+            db.or_(self.username.ilike(pattern), self.e_mail.ilike(pattern))
+        )
+        query = query.where(db.tuple_(self.username, self.id) > after)
+        return query.order_by(self.username, self.id).limit(db.bindparam("limit"))
+
+    @staticmethod
+    async def search(
+        term: str, cursor: typing.Optional[str], limit: int
+    ) -> typing.Tuple[list, typing.Optional[str]]:
+        """Searches users by username or e-mail (trigram indexed)
+
+        Args:
+            term (str): substring to search for, empty string matches all users
+            cursor (typing.Optional[str]): continuation token or None for first page
+            limit (int): Query Limit
+
+        Raises:
+            ValueError: if cursor is malformed
+
+        Returns:
+            typing.Tuple[list, typing.Optional[str]]: Users and token of next page (or None)
+        """
+        pattern = f"%{escape_like(term)}%"
+        if cursor is None:
+            users = await User.search_first_query.all(pattern=pattern, limit=limit + 1)
+        else:
+            username, id = decode_cursor(cursor, 2, (str, int))
+            users = await User.search_query.all(
+                pattern=pattern, username=username, id=id, limit=limit + 1
+            )
+        if len(users) <= limit:
+            return users, None
+        last = users[limit - 1]
+        return users[:limit], encode_cursor(last.username, last.id)
+
+    @staticmethod
+    def search_stream(
+        term: str,
+        cursor: typing.Optional[str],
+        limit: int,
+        on_chunk: typing.Optional[typing.Callable] = None,
+    ) -> StreamedPage:
+        """Like :meth:`search`, but rows are loaded lazily while iterating
+
+        Raises:
+            ValueError: if cursor is malformed
+        """
+        params = dict(pattern=f"%{escape_like(term)}%")
+        if cursor is None:
+            query = User.search_first_query
+        else:
+            query = User.search_query
+            params["username"], params["id"] = decode_cursor(cursor, 2, (str, int))
+        return StreamedPage(
+            query,
+            limit,
+            key=lambda user: (user.username, user.id),
+            on_chunk=on_chunk,
+            **params,
+        )
+
     @staticmethod
     def gen_password(password: str) -> str:
         if len(password) == 128:
@@ -127,6 +253,32 @@ class User(db.Model):
     def verify_by_token(self, token: str) -> bool:
         return check_password_hash(self.token, token)
 
+    # Async variants run the hashing on app.hash_pool and raise
+    # app.hashing.PoolSaturated instead of queueing without bound
+
+    @staticmethod
+    async def gen_password_async(password: str) -> str:
+        return await app.hash_pool.run(User.gen_password, password)
+
+    async def verify_password_async(self, password: str) -> bool:
+        return await app.hash_pool.run(check_password_hash, self.password, password)
+
+    async def generate_token_async(self) -> str:
+        """Generates authentication usable token off the event loop
+
+        Returns:
+            str: token (342 chars long, 64 bytes)
+        """
+        token = token_urlsafe(64)
+        self.token = await app.hash_pool.run(generate_password_hash, token)
+        return token
+
+    async def verify_by_token_async(self, token: str) -> bool:
+        return await app.hash_pool.run(check_password_hash, self.token, token)
+
+    # Columns served by /api/users (see app/serializers.py)
+    api_fields = ("id", "username", "e_mail")
+
     def jsonify(self) -> dict:
         return dict(id=self.id, username=self.username, e_mail=self.e_mail)
 
@@ -142,15 +294,131 @@ class User(db.Model):
         return f"<User {self.username} [{self.id}]>"
 
 
+class ApiToken(db.Model):
+    """Selector/ verifier API token
+
+    The public selector is looked up by a unique index, the verifier is only
+    stored as keyed SHA-256 (HMAC with the app secret) and compared in
+    constant time. Tokens are revoked by deleting their row.
+    """
+
+    __tablename__ = "apitokens"
+
+    id = db.Column(db.Integer, unique=True, primary_key=True)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    selector = db.Column(db.String(16), unique=True, nullable=False)
+    verifier = db.Column(db.String(64), nullable=False)
+    token_expiration = db.Column(db.DateTime)
+    created = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+
+    @staticmethod
+    def hash_verifier(verifier: str) -> str:
+        key = app.secret_key
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        return hmac_new(key, verifier.encode("utf-8"), sha256).hexdigest()
+
+    @db.bake
+    def get_by_selector_query(self):
+        """Constructs Query for getting a token and its user by selector"""
+        query = self.join(User, User.id == self.user_id).select()
+        query = query.where(self.selector == db.bindparam("selector"))
+        return query.execution_options(loader=self.load(user=User))
+
+    @staticmethod
+    async def issue(user: User, expires_in: typing.Optional[timedelta] = None) -> str:
+        """Creates a new token for user
+
+        Args:
+            user (User): owner of the token
+            expires_in (typing.Optional[timedelta], optional): lifetime. Defaults to None (no expiration).
+
+        Returns:
+            str: token as ``<selector>.<verifier>`` (only available once)
+        """
+        selector, verifier = token_urlsafe(12), token_urlsafe(32)
+        await ApiToken.create(
+            user_id=user.id,
+            selector=selector,
+            verifier=ApiToken.hash_verifier(verifier),
+            token_expiration=(
+                datetime.utcnow() + expires_in if expires_in is not None else None
+            ),
+        )
+        return f"{selector}.{verifier}"
+
+    @staticmethod
+    async def authenticate(token: str) -> typing.Optional[User]:
+        """Gets the user of a valid, unexpired token with one indexed lookup
+
+        Returns:
+            typing.Optional[User]: owner of the token or None
+        """
+        selector, _, verifier = token.partition(".")
+        if not selector or not verifier:
+            return None
+        api_token = await ApiToken.get_by_selector_query.first(selector=selector)
+        if api_token is None or not compare_digest(
+            api_token.verifier, ApiToken.hash_verifier(verifier)
+        ):
+            return None
+        if (
+            api_token.token_expiration is not None
+            and api_token.token_expiration <= datetime.utcnow()
+        ):
+            return None
+        return api_token.user
+
+    async def revoke(self) -> None:
+        await self.delete()
+
+    @staticmethod
+    async def revoke_all(user: User) -> None:
+        await ApiToken.delete.where(ApiToken.user_id == user.id).gino.status()
+
+    def __repr__(self) -> str:
+        return f"<ApiToken {self.selector} u:{self.user_id} [{self.id}]>"
+
+
 class Room(db.Model):
     __tablename__ = "rooms"
 
     id = db.Column(db.Integer, unique=True, primary_key=True)
-    nick = db.Column(db.String(90), unique=True)
+    # NOT NULL, (nick, id) keyset pagination stops at NULL
+    nick = db.Column(db.String(90), unique=True, nullable=False)
     description = db.Column(db.Text())
-    meta = db.Column(db.JSON)
+    meta = db.Column(db.JSONB)
 
     master_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"))
+    # Moved forward by a trigger on every change of the room's reservations (UTC)
+    reservations_modified = db.Column(
+        db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())")
+    )
+
+    _overview_idx = db.Index("ix_rooms_nick_id", "nick", "id")
+    # Containment (meta @> ...), see filter_by_meta
+    _meta_idx = db.Index(
+        "ix_rooms_meta",
+        "meta",
+        postgresql_using="gin",
+        postgresql_ops={"meta": "jsonb_path_ops"},
+    )
+    # meta keys with a btree index on (meta -> key) for range filters
+    meta_ranges = ("capacity",)
+    _meta_capacity_idx = db.Index(
+        "ix_rooms_meta_capacity", db.text("(meta -> 'capacity')")
+    )
+
+    @db.bake
+    def get_calendar_stamp_query(self):
+        """Constructs Query for getting (nick, reservations_modified) of a room"""
+        query = db.select([self.nick, self.reservations_modified])
+        return query.where(self.id == db.bindparam("id"))
 
     @db.bake
     def get_by_nick_query(self):
@@ -160,18 +428,182 @@ class Room(db.Model):
     async def get_by_nick(nick: str):
         return await Room.get_by_nick_query.first(nick=nick)
 
+    @db.bake
+    def overview_first_query(self):
+        return self.query.order_by(self.nick.desc(), self.id.desc()).limit(
+            db.bindparam("limit")
+        )
+
     @db.bake
     def overview_paginated_query(self):
-        query = (
-            self.query.offset(db.bindparam("offset"))
-            .limit(db.bindparam("limit"))
-            .order_by(self.nick.desc())
+        """Constructs keyset Query for rooms after (nick, id) for baking"""
+        after = db.tuple_(db.bindparam("nick"), db.bindparam("id"))
+        query = self.query.where(db.tuple_(self.nick, self.id) < after)
+        return query.order_by(self.nick.desc(), self.id.desc()).limit(
+            db.bindparam("limit")
         )
+
+    @staticmethod
+    async def overview_paginated(
+        cursor: typing.Optional[str], limit: int
+    ) -> typing.Tuple[list, typing.Optional[str]]:
+        """Gets a keyset paginated slice of rooms for RoomsOverviewRoute
+
+        Args:
+            cursor (typing.Optional[str]): continuation token or None for first page
+            limit (int): Query Limit
+
+        Raises:
+            ValueError: if cursor is malformed
+
+        Returns:
+            typing.Tuple[list, typing.Optional[str]]: Rooms and token of next page (or None)
+        """
+        if cursor is None:
+            rooms = await Room.overview_first_query.all(limit=limit + 1)
+        else:
+            nick, id = decode_cursor(cursor, 2, (str, int))
+            rooms = await Room.overview_paginated_query.all(
+                nick=nick, id=id, limit=limit + 1
+            )
+        if len(rooms) <= limit:
+            return rooms, None
+        last = rooms[limit - 1]
+        return rooms[:limit], encode_cursor(last.nick, last.id)
+
+    @staticmethod
+    def overview_stream(
+        cursor: typing.Optional[str],
+        limit: int,
+        contains: typing.Optional[dict] = None,
+        ranges: typing.Optional[dict] = None,
+    ) -> StreamedPage:
+        """Like :meth:`overview_paginated`, but rows are loaded lazily while iterating
+
+        Args:
+            contains, ranges: meta filters, see :meth:`filter_by_meta`
+
+        Raises:
+            ValueError: if cursor is malformed or a range key isn't indexed
+        """
+        params = dict()
+        if cursor is not None:
+            params["nick"], params["id"] = decode_cursor(cursor, 2, (str, int))
+        if contains or ranges:
+            query = Room.filter_by_meta(Room.query, contains, ranges)
+            if cursor is not None:
+                after = db.tuple_(db.bindparam("nick"), db.bindparam("id"))
+                query = query.where(db.tuple_(Room.nick, Room.id) < after)
+            query = query.order_by(Room.nick.desc(), Room.id.desc()).limit(
+                db.bindparam("limit")
+            )
+        elif cursor is None:
+            query = Room.overview_first_query
+        else:
+            query = Room.overview_paginated_query
+        return StreamedPage(
+            query, limit, key=lambda room: (room.nick, room.id), **params
+        )
+
+    @staticmethod
+    def filter_by_meta(
+        query=None,
+        contains: typing.Optional[dict] = None,
+        ranges: typing.Optional[
+            typing.Dict[
+                str, typing.Tuple[typing.Optional[float], typing.Optional[float]]
+            ]
+        ] = None,
+    ):
+        """Restricts query (all rooms by default) to rooms with matching meta
+
+        All values of contains are matched with a single containment predicate
+        (``meta @> ...``, answered by the ix_rooms_meta GIN index). Ranges
+        compare the numeric ``meta -> key`` against inclusive bounds and are
+        answered by the btree index of key.
+
+        Args:
+            query (optional): Query to restrict. Defaults to None (Room.query).
+            contains (typing.Optional[dict], optional): meta values rooms must have (types must match, ``4`` doesn't match ``"4"``, numeric keys are stored as numbers). Defaults to None.
+            ranges (optional): {key: (min, max)}, either bound may be None. Keys must be in :attr:`meta_ranges`. Defaults to None.
+
+        Raises:
+            ValueError: if a range key has no index
+
+        Returns:
+            Query: query with meta predicates
+        """
+        query = Room.query if query is None else query
+        if contains:
+            query = query.where(Room.meta.contains(contains))
+        for key, (low, high) in (ranges or {}).items():
+            if key not in Room.meta_ranges:
+                raise ValueError(f"No range index on meta key {key}")
+            # The key is inlined (not a parameter) to match the index expression
+            value = Room.meta.op("->")(db.literal_column(f"'{key}'"))
+            query = query.where(db.func.jsonb_typeof(value) == "number")
+            if low is not None:
+                query = query.where(value >= db.func.to_jsonb(db.cast(low, db.Float)))
+            if high is not None:
+                query = query.where(value <= db.func.to_jsonb(db.cast(high, db.Float)))
         return query
 
     @staticmethod
-    async def overview_paginated(offset: int, limit: int) -> list:
-        return await Room.overview_paginated_query.all(offset=offset, limit=limit)
+    async def available(
+        start: datetime,
+        end: datetime,
+        capacity: typing.Optional[int] = None,
+        meta: typing.Optional[dict] = None,
+        offset: int = 0,
+        limit: int = 10,
+    ) -> list:
+        """Gets rooms without any reservation overlapping [start, end)
+
+        Overlaps are excluded with a single anti-join (NOT EXISTS) which is
+        answered by the reservations GiST exclusion index.
+
+        Args:
+            start (datetime): Start of requested window
+            end (datetime): End of requested window
+            capacity (typing.Optional[int], optional): Minimum meta.capacity. Rooms with the smallest surplus are returned first. Defaults to None.
+            meta (typing.Optional[dict], optional): meta values rooms must contain (see :meth:`filter_by_meta`). Defaults to None.
+            offset (int, optional): Query Offset. Defaults to 0.
+            limit (int, optional): Query Limit. Defaults to 10.
+
+        Returns:
+            list: List of free Rooms or empty list
+        """
+        window = db.func.tsrange(start, end)
+        overlapping = (
+            db.exists()
+            .where(Reservation.room_id == Room.id)
+            .where(db.func.tsrange(Reservation.start, Reservation.end).op("&&")(window))
+        )
+        query = Room.query.where(~overlapping)
+
+        ranges = None if capacity is None else dict(capacity=(capacity, None))
+        query = Room.filter_by_meta(query, meta, ranges)
+        if capacity is not None:
+            # jsonb numbers sort numerically, smallest surplus first
+            query = query.order_by(Room.meta.op("->")(db.literal_column("'capacity'")))
+
+        query = query.order_by(Room.nick, Room.id).offset(offset).limit(limit)
+        return await query.gino.all()
+
+    export_columns = ("id", "nick", "description", "meta")
+    api_fields = ("id", "nick", "description", "meta", "master_id")
+
+    @staticmethod
+    def export_query():
+        """Constructs Query for exporting all rooms as tuples (by id)"""
+        return db.select([Room.id, Room.nick, Room.description, Room.meta]).order_by(
+            Room.id
+        )
+
+    def jsonify(self) -> dict:
+        return dict(
+            id=self.id, nick=self.nick, description=self.description, meta=self.meta
+        )
 
     def get_links(self) -> list:
         return [(f"/room/view/{self.id}", "Ansehen")]
@@ -187,31 +619,119 @@ class Reservation(db.Model):
     room_id = db.Column(db.Integer, db.ForeignKey("rooms.id", ondelete="CASCADE"))
     user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"))
     is_public = db.Column(db.Boolean)
-    meta = db.Column(db.JSON)
+    meta = db.Column(db.JSONB)
     start = db.Column(db.DateTime, nullable=False)
     end = db.Column(db.DateTime, nullable=False)
+    # Set by trigger on every update (UTC)
+    modified = db.Column(
+        db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())")
+    )
+
+    _overview_idx = db.Index(
+        "ix_reservations_public_start_id",
+        "start",
+        "id",
+        postgresql_where=db.text("is_public"),
+    )
+
+    # Overlaps per room are prevented by the reservations_room_id_during_excl
+    # exclusion constraint (GiST over tsrange(start, "end"), see migrations)
+
+    @db.bake
+    def get_upcoming_query(self):
+        """Constructs Query for getting reservations of a room ending after horizon"""
+        query = self.query.where(self.room_id == db.bindparam("room_id"))
+        query = query.where(self.end > db.bindparam("horizon"))
+        return query.order_by(self.start)
+
+    @db.bake
+    def get_calendar_query(self):
+        """Constructs Query for getting calendar tuples of a room ending after horizon"""
+        query = db.select(
+            [self.id, self.start, self.end, self.modified, self.is_public, self.meta]
+        )
+        query = query.where(self.room_id == db.bindparam("room_id"))
+        query = query.where(self.end > db.bindparam("horizon"))
+        return query.order_by(self.start, self.id)
+
+    @db.bake
+    def overview_first_query(self):
+        query = self.query.where(self.is_public == True)
+        return query.order_by(self.start.desc(), self.id.desc()).limit(
+            db.bindparam("limit")
+        )
 
     @db.bake
     def overview_paginated_query(self):
+        """Constructs keyset Query for public reservations after (start, id)"""
+        after = db.tuple_(db.bindparam("start"), db.bindparam("id"))
         query = self.query.where(self.is_public == True)
-        query.offset(db.bindparam("offset")).limit(db.bindparam("limit"))
-        query.order_by(self.start.desc())
-        return query
+        query = query.where(db.tuple_(self.start, self.id) < after)
+        return query.order_by(self.start.desc(), self.id.desc()).limit(
+            db.bindparam("limit")
+        )
 
     @staticmethod
-    async def overview_paginated(offset: int, limit: int) -> list:
-        """Gets paginated slices o public reservations for EventsOverviewRoute
+    async def overview_paginated(
+        cursor: typing.Optional[str], limit: int
+    ) -> typing.Tuple[list, typing.Optional[str]]:
+        """Gets keyset paginated slices of public reservations for EventsOverviewRoute
 
         Args:
-            offset (int): Query Offset
+            cursor (typing.Optional[str]): continuation token or None for first page
             limit (int): Query Limit
 
+        Raises:
+            ValueError: if cursor is malformed
+
         Returns:
-            list: List of Reservations maybe List of Reservations or empty list
+            typing.Tuple[list, typing.Optional[str]]: Reservations and token of next page (or None)
         """
-        return await Reservation.overview_paginated_query.all(
-            offset=offset, limit=limit
-        )
+        if cursor is None:
+            reservations = await Reservation.overview_first_query.all(limit=limit + 1)
+        else:
+            start, id = decode_cursor(cursor, 2, (str, int))
+            reservations = await Reservation.overview_paginated_query.all(
+                start=datetime.fromisoformat(start), id=id, limit=limit + 1
+            )
+        if len(reservations) <= limit:
+            return reservations, None
+        last = reservations[limit - 1]
+        return reservations[:limit], encode_cursor(last.start.isoformat(), last.id)
+
+    export_columns = ("id", "room_id", "start", "end", "meta")
+    api_fields = ("id", "room_id", "start", "end", "meta")
+
+    @staticmethod
+    def export_query(
+        start: typing.Optional[datetime] = None,
+        end: typing.Optional[datetime] = None,
+        room_id: typing.Optional[int] = None,
+    ):
+        """Constructs Query for exporting public reservations as tuples (oldest first)
+
+        Args:
+            start (typing.Optional[datetime], optional): Only reservations ending after start. Defaults to None.
+            end (typing.Optional[datetime], optional): Only reservations starting before end. Defaults to None.
+            room_id (typing.Optional[int], optional): Only reservations of this room. Defaults to None.
+        """
+        query = db.select(
+            [
+                Reservation.id,
+                Reservation.room_id,
+                Reservation.start,
+                Reservation.end,
+                Reservation.meta,
+            ]
+        ).where(Reservation.is_public == True)
+        if start is not None:
+            query = query.where(Reservation.end > start)
+        if end is not None:
+            query = query.where(Reservation.start < end)
+        if room_id is not None:
+            query = query.where(Reservation.room_id == room_id)
+        # Walks ix_reservations_public_start_id
+        return query.order_by(Reservation.start, Reservation.id)
 
     def __repr__(self) -> str:
         return f"<Reservation r:{self.room_id}/u:{self.user_id} [{self.id}]>"
@@ -226,6 +746,21 @@ class TranslationUnits(db.Model):
     translation = db.Column(db.String)
     label = db.Column(db.String, nullable=False)
     lang = db.Column(db.String, nullable=False)
+    # Bumped from translationunits_version_seq on every insert/ update (trigger)
+    _version_seq = db.Sequence("translationunits_version_seq")
+    version = db.Column(
+        db.BigInteger,
+        _version_seq,
+        nullable=False,
+        index=True,
+        server_default=_version_seq.next_value(),
+    )
+
+    _unit_lang_uq = db.UniqueConstraint(
+        "unit", "lang", name="uq_translationunits_unit_lang"
+    )
+
+    api_fields = ("id", "unit", "lang", "default", "translation", "label")
 
     def __html__(self) -> str:
         return dumps(self.jsonify())
@@ -241,8 +776,8 @@ class TranslationUnits(db.Model):
 
     @db.bake
     def get_unit_query(self):
-        return self.query.where(
-            self.lang == db.bindparam("lang") and self.unit == db.bindparam("unit")
+        return self.query.where(self.lang == db.bindparam("lang")).where(
+            self.unit == db.bindparam("unit")
         )
 
     @db.bake
@@ -257,5 +792,54 @@ class TranslationUnits(db.Model):
     async def get_unit(unit: str, lang: str = "en"):
         return await TranslationUnits.get_unit_query.first(unit=unit, lang=lang)
 
+    @staticmethod
+    async def seed(units: typing.Dict[str, dict], force: bool = False) -> int:
+        """Inserts units (format of default-units.json) with a single statement
+
+        Args:
+            units (typing.Dict[str, dict]): {lang: {unit: {default, label}}}
+            force (bool, optional): Overwrite default and label of existing
+                units. Defaults to False (existing units are skipped).
+
+        Returns:
+            int: number of inserted or changed units
+        """
+        rows = [
+            (lang, unit, items["default"], items["label"])
+            for lang, lang_units in units.items()
+            for unit, items in lang_units.items()
+        ]
+        if not rows:
+            return 0
+        langs, names, defaults, labels = map(list, zip(*rows))
+        status, _ = await db.status(
+            SEED_UPDATE_QUERY if force else SEED_QUERY,
+            langs=langs,
+            units=names,
+            defaults=defaults,
+            labels=labels,
+        )
+        return int(status.split()[-1])
+
     def __repr__(self) -> str:
         return f"<TranslationUnit {self.unit} [{self.id}] [{self.lang}]>"
+
+
+# Arrays are unnested server side, so any number of units is one round trip
+_SEED_INSERT = """
+    INSERT INTO translationunits (lang, unit, "default", label)
+    SELECT * FROM unnest(
+        CAST(:langs AS varchar[]),
+        CAST(:units AS varchar[]),
+        CAST(:defaults AS varchar[]),
+        CAST(:labels AS varchar[])
+    )
+    ON CONFLICT ON CONSTRAINT uq_translationunits_unit_lang
+"""
+SEED_QUERY = db.text(_SEED_INSERT + "DO NOTHING")
+SEED_UPDATE_QUERY = db.text(_SEED_INSERT + """
+    DO UPDATE SET "default" = excluded."default", label = excluded.label
+    -- Unchanged units keep their version (and send no notification)
+    WHERE (translationunits."default", translationunits.label)
+        IS DISTINCT FROM (excluded."default", excluded.label)
+""")
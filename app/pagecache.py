@@ -0,0 +1,153 @@
+__doc__ = """
+Opt-in cache for rendered pages with ETag/ conditional GET support.
+
+Pages are keyed on endpoint, route and query arguments, ``request.locale`` and
+the data version stamps the page depends on. Versions are either provided by
+callables (e.g. the translation cache version) or are local counters bumped
+with :meth:`PageCache.bump`, by every worker when subscribed to a NOTIFY
+channel (:meth:`PageCache.listen`). Without LISTEN ``PAGE_CACHE_TTL`` bounds
+how long a page can miss writes. Streamed responses are passed
+through on a miss and cached once they were sent completely, unless they grew
+larger than ``PAGE_CACHE_MAX_BYTES``.
+"""
+
+import asyncio
+import typing
+from collections import OrderedDict
+from functools import wraps
+from hashlib import sha1
+from time import monotonic
+from quart import Quart, Response, request, make_response
+from quart.wrappers.response import DataBody
+from werkzeug.http import parse_etags
+
+
+class PageCache:
+    def __init__(self, app: Quart):
+        self.app, self.pages = app, OrderedDict()
+        self.size = int(app.config.get("PAGE_CACHE_SIZE", 512))
+        self.ttl = float(app.config.get("PAGE_CACHE_TTL", 30))
+        # Larger streamed pages are passed through without being buffered
+        self.max_bytes = int(app.config.get("PAGE_CACHE_MAX_BYTES", 1 << 20))
+        self.versions = dict()
+        self.hits = self.misses = 0
+
+    def register_version(self, name: str, provider: typing.Callable[[], typing.Any]):
+        """Registers a callable returning the current version stamp of name"""
+        self.versions[name] = provider
+
+    def bump(self, name: str) -> None:
+        """Increments a local version counter (after a write to its data)"""
+        version = self.versions.get(name, None)
+        count = version() if version is not None else 0
+        self.versions[name] = lambda: count + 1
+
+    def listen(self, listener, name: str, channel: str) -> None:
+        """Bumps version name on every notification on channel (see helper.Listener)
+
+        Notifications may have been missed while the connection was down, so
+        the version is bumped after a reconnect as well. With read replicas
+        it is bumped again ``DB_REPLICA_PIN_SECONDS`` later, pages rendered
+        from a lagging replica in between are dropped then.
+        """
+        delay = 0.0
+        if self.app.config.get("DB_REPLICA_URLS"):
+            delay = float(self.app.config.get("DB_REPLICA_PIN_SECONDS", 0))
+
+        async def resync():
+            self.bump(name)
+
+        async def bump_later():
+            await asyncio.sleep(delay)
+            self.bump(name)
+
+        def on_notify(payload: str):
+            self.bump(name)
+            return bump_later() if delay else None
+
+        listener.subscribe(channel, on_notify, resync)
+
+    def version(self, name: str):
+        provider = self.versions.get(name, None)
+        return provider() if provider is not None else 0
+
+    def key(self, depends_on: typing.Tuple[str, ...]) -> tuple:
+        return (
+            request.endpoint,
+            tuple(sorted(request.view_args.items())),
+            tuple(sorted(request.args.items(multi=True))),
+            str(getattr(request, "locale", "")),
+            tuple(self.version(name) for name in depends_on),
+        )
+
+    def respond(self, body: bytes, content_type: str, etag: str) -> Response:
+        if etag in parse_etags(request.headers.get("If-None-Match", None)):
+            response = Response("", status=304)
+        else:
+            response = Response(body, content_type=content_type)
+        response.headers["ETag"] = f'"{etag}"'
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["Vary"] = "Accept-Language"
+        return response
+
+    def store(self, key: tuple, now: float, body: bytes, content_type: str) -> str:
+        etag = sha1(body).hexdigest()
+        self.pages[key] = (now + self.ttl, body, content_type, etag)
+        self.pages.move_to_end(key)
+        while len(self.pages) > self.size:
+            self.pages.popitem(last=False)
+        return etag
+
+    async def tee(self, key: tuple, now: float, response: Response):
+        chunks, size = [], 0
+        async with response.response as body:
+            async for chunk in body:
+                if chunks is not None:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        chunks = None
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+        if chunks is not None:
+            self.store(key, now, b"".join(chunks), response.content_type)
+
+    def cached(self, *depends_on: str):
+        """Decorator caching rendered responses of a GET route
+
+        Args:
+            *depends_on (str): names of data versions the page depends on
+                (e.g. ``"rooms"``, ``"translations"``)
+        """
+
+        def decorator(view):
+            @wraps(view)
+            async def wrapper(*args, **kwargs):
+                if request.method != "GET":
+                    return await view(*args, **kwargs)
+
+                key, now = self.key(depends_on), monotonic()
+                page = self.pages.get(key, None)
+                if page is not None and page[0] > now:
+                    self.pages.move_to_end(key)
+                    self.hits += 1
+                    return self.respond(*page[1:])
+
+                self.misses += 1
+                response = await make_response(await view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if not isinstance(response.response, DataBody):
+                    # Streamed: pass chunks through and store the page once complete
+                    return Response(
+                        self.tee(key, now, response),
+                        status=response.status_code,
+                        headers=response.headers,
+                    )
+                body = await response.get_data(raw=True)
+                etag = self.store(key, now, body, response.content_type)
+                return self.respond(body, response.content_type, etag)
+
+            return wrapper
+
+        return decorator
@@ -1,22 +1,136 @@
-from . import app
-from .models import Room, User, TranslationUnits
-from .schemas import UserRegisterSchema
+from . import app, db
+from .models import Room, User, TranslationUnits, Reservation
+from .schemas import (
+    UserRegisterSchema,
+    AvailabilitySchema,
+    ExportSchema,
+    ApiListSchema,
+)
+from .serializers import TupleSerializer
 from flask_babel import get_locale
+from math import isfinite
+from ujson import dumps, loads
+from voluptuous import MultipleInvalid
 from quart import request, render_template, Response, abort, redirect
+from .helper import stream_template, stream_export
+
+USERS_PER_PAGE = 50
 
 
 @app.route("/")
+@app.page_cache.cached("translations")
+@db.no_connection
 async def index():
     return await render_template("index.html")
 
 
 # Rooms
+def parse_meta_filters(args: dict) -> tuple:
+    """Parses room meta filters from query arguments
+
+    ``meta-<key>=<value>`` requires meta[key] to equal value. Values are JSON
+    scalars if they parse as such (``4``, ``true``, ``"4"``), strings
+    otherwise. ``min-<key>``/ ``max-<key>`` bound numeric keys (see
+    :attr:`Room.meta_ranges`).
+
+    Returns:
+        tuple: contains and ranges for :meth:`Room.filter_by_meta`
+    """
+    contains, ranges = dict(), dict()
+    for key, value in args.items():
+        if key.startswith("meta-"):
+            try:
+                parsed = loads(value)
+            except ValueError:
+                parsed = value
+            if not isinstance(parsed, (bool, int, float, str)):
+                parsed = value
+            contains[key[5:]] = parsed
+        elif key.startswith(("min-", "max-")):
+            name = key[4:]
+            if name not in Room.meta_ranges:
+                abort(400)
+            try:
+                bound = float(value)
+            except ValueError:
+                abort(400)
+            if not isfinite(bound):
+                abort(400)
+            low, high = ranges.get(name, (None, None))
+            ranges[name] = (bound, high) if key[:3] == "min" else (low, bound)
+    return contains, ranges
+
+
 @app.route("/rooms/")
-@app.route("/rooms/<int:page>")
-async def rooms_overview(page: int = 1):
-    per_page = request.args.get("per-page", 10)
-    rooms = await Room.overview_paginated(offset=(page - 1) * per_page, limit=per_page)
-    return await render_template("rooms/overview.html", rooms=rooms)
+@app.route("/rooms/<cursor>")
+@app.page_cache.cached("rooms")
+@db.no_connection
+@db.read_only
+async def rooms_overview(cursor: str = None):
+    """Route for the rooms overview
+
+    Query parameters are ``per-page`` and meta filters (see
+    :func:`parse_meta_filters`), e.g. ``?meta-projector=yes&min-capacity=8``.
+    """
+    per_page = max(1, min(request.args.get("per-page", 10, type=int), 100))
+    filters = {
+        key: value
+        for key, value in request.args.items()
+        if key.startswith(("meta-", "min-", "max-", "per-page"))
+    }
+    contains, ranges = parse_meta_filters(filters)
+    try:
+        rooms = Room.overview_stream(cursor, per_page, contains, ranges)
+    except ValueError:
+        abort(400)
+    return await stream_template("rooms/overview.html", rooms=rooms, filters=filters)
+
+
+@app.route("/rooms/<int:id>/calendar.ics")
+@db.no_connection
+@db.read_only
+async def room_calendar(id: int) -> Response:
+    """iCalendar feed of a room, answers 304 while its reservations are unchanged"""
+    return await app.calendars.respond(id)
+
+
+@app.route("/rooms/available")
+@db.read_only
+async def rooms_available() -> Response:
+    """Route for finding rooms free for a whole time window
+
+    Query parameters are ``start`` and ``end`` (ISO 8601), an optional
+    minimum ``capacity``, ``meta-<key>=<value>`` constraints on room meta data
+    and ``page``/ ``per-page``.
+
+    Returns:
+        Response: JSON with the free rooms of the requested page, best fit first
+    """
+    try:
+        args = AvailabilitySchema(request.args.to_dict())
+    except MultipleInvalid:
+        abort(400)
+    if args["end"] <= args["start"]:
+        abort(400)
+
+    meta, _ = parse_meta_filters(
+        {key: value for key, value in args.items() if key.startswith("meta-")}
+    )
+    page, per_page = args["page"], args["per-page"]
+    rooms = await Room.available(
+        args["start"],
+        args["end"],
+        capacity=args.get("capacity", None),
+        meta=meta,
+        offset=(page - 1) * per_page,
+        limit=per_page + 1,
+    )
+    body = dict(
+        page=page,
+        next=page + 1 if len(rooms) > per_page else None,
+        rooms=[room.jsonify() for room in rooms[:per_page]],
+    )
+    return Response(dumps(body), mimetype="application/json")
 
 
 # Admin
@@ -36,14 +150,44 @@ async def edit_unit(unit: str) -> Response:
 
 # Users
 @app.route("/users")
+@db.read_only
 async def user_overview() -> Response:
     """Route for user overview. Contains table with user and search
 
     Returns:
         Response: [description]
     """
-    users = await User.query.gino.all()
-    return await render_template("admin/users.html", users=users)
+    per_page = max(1, min(request.args.get("per-page", USERS_PER_PAGE, type=int), 100))
+    roles = dict()
+
+    async def load_roles(users: list):
+        roles.update(await app.roles.get_many([user.id for user in users]))
+
+    users = User.search_stream("", None, limit=per_page, on_chunk=load_roles)
+    return await stream_template("admin/users.html", users=users, roles=roles)
+
+
+@app.route("/users/search")
+@db.read_only
+async def user_search() -> Response:
+    """Search API for the user overview. Pages through users matching ``q``
+
+    Returns:
+        Response: JSON with rendered table ``rows`` and ``next`` cursor (or null)
+    """
+    try:
+        users, next_cursor = await User.search(
+            request.args.get("q", ""),
+            request.args.get("cursor", None),
+            limit=USERS_PER_PAGE,
+        )
+    except ValueError:
+        abort(400)
+    roles = await app.roles.get_many([user.id for user in users])
+    rows = await render_template("admin/user-rows.html", users=users, roles=roles)
+    return Response(
+        dumps(dict(rows=rows, next=next_cursor)), mimetype="application/json"
+    )
 
 
 @app.route("/users/edit/<int:id>", methods=["GET", "POST"])
@@ -66,3 +210,114 @@ async def edit_user_route(id: int) -> Response:
 @app.before_request
 async def evaluate_locale():
     request.locale = get_locale()
+
+
+# API
+@app.route("/api/reservations/export")
+@db.no_connection
+@db.read_only
+async def export_reservations() -> Response:
+    """Streams all public reservations as NDJSON (default) or CSV
+
+    Query parameters are ``format`` (``ndjson``/ ``csv``), ``start`` and
+    ``end`` (ISO 8601, reservations overlapping the range) and ``room`` (id).
+    """
+    try:
+        args = ExportSchema(request.args.to_dict())
+    except MultipleInvalid:
+        abort(400)
+    query = Reservation.export_query(
+        args.get("start", None), args.get("end", None), args.get("room", None)
+    )
+    return stream_export(query, Reservation.export_columns, args["format"])
+
+
+@app.route("/api/rooms/export")
+@db.no_connection
+@db.read_only
+async def export_rooms() -> Response:
+    """Streams all rooms as NDJSON (default) or CSV (``format`` parameter)"""
+    try:
+        args = ExportSchema(request.args.to_dict())
+    except MultipleInvalid:
+        abort(400)
+    return stream_export(Room.export_query(), Room.export_columns, args["format"])
+
+
+ROOMS_API = TupleSerializer(Room, Room.api_fields)
+RESERVATIONS_API = TupleSerializer(
+    Reservation, Reservation.api_fields, where=lambda: Reservation.is_public == True
+)
+USERS_API = TupleSerializer(User, User.api_fields)
+UNITS_API = TupleSerializer(TranslationUnits, TranslationUnits.api_fields)
+
+
+def parse_api_args() -> dict:
+    try:
+        return ApiListSchema(request.args.to_dict())
+    except MultipleInvalid:
+        abort(400)
+
+
+async def api_list(serializer: TupleSerializer, args: dict, *clauses) -> Response:
+    """Responds with one page of serializer's rows matching clauses
+
+    Query parameters are ``fields`` (comma separated, all by default),
+    ``cursor`` (``next`` of the previous page) and ``limit`` (max. 1000).
+    """
+    try:
+        fields = serializer.parse_fields(args.get("fields", None))
+        query = serializer.query(fields, args.get("cursor", None), args["limit"])
+    except ValueError:
+        abort(400)
+    for clause in clauses:
+        query = query.where(clause)
+    rows = await db.all(query)
+    return Response(
+        serializer.page(rows, fields, args["limit"]), mimetype="application/json"
+    )
+
+
+@app.route("/api/rooms")
+@db.no_connection
+@db.read_only
+async def api_rooms() -> Response:
+    return await api_list(ROOMS_API, parse_api_args())
+
+
+@app.route("/api/reservations")
+@db.no_connection
+@db.read_only
+async def api_reservations() -> Response:
+    """Public reservations, optionally of one ``room``"""
+    args = parse_api_args()
+    clauses = []
+    if "room" in args:
+        clauses.append(Reservation.room_id == args["room"])
+    return await api_list(RESERVATIONS_API, args, *clauses)
+
+
+@app.route("/api/users")
+@db.no_connection
+@db.read_only
+async def api_users() -> Response:
+    """Users (with e-mail addresses), only for superuser API tokens"""
+    if request.api_user is None:
+        return "", 401, {"WWW-Authenticate": "Bearer"}
+    if not request.api_user.is_superuser:
+        abort(403)
+    return await api_list(USERS_API, parse_api_args())
+
+
+@app.route("/api/units")
+@db.no_connection
+@db.read_only
+async def api_units() -> Response:
+    """Translation units, optionally of one ``unit`` and/ or ``lang``"""
+    args = parse_api_args()
+    clauses = [
+        getattr(TranslationUnits, key) == args[key]
+        for key in ("unit", "lang")
+        if key in args
+    ]
+    return await api_list(UNITS_API, args, *clauses)
@@ -7,8 +7,13 @@ from voluptuous import (
     Invalid,
     Length,
     MultipleInvalid,
+    ALLOW_EXTRA,
+    Coerce,
+    Range,
+    In,
 )
 from re import fullmatch
+from datetime import datetime, timezone
 
 
 class WrappedSchema(Schema):
@@ -35,6 +40,17 @@ def is_url(url: str) -> bool:
         raise Invalid("Invalid Url supplied")
 
 
+def naive_utc(value: str) -> datetime:
+    """Parses an ISO 8601 datetime, aware values are converted to naive UTC
+
+    Timestamps are stored without time zone, asyncpg rejects aware values.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
 UserRegisterSchema = WrappedSchema(
     {
         Optional("username"): str,
@@ -43,3 +59,39 @@ UserRegisterSchema = WrappedSchema(
     },
     extra=REMOVE_EXTRA,
 )
+
+
+AvailabilitySchema = Schema(
+    {
+        Required("start"): Coerce(naive_utc),
+        Required("end"): Coerce(naive_utc),
+        Optional("capacity"): All(Coerce(int), Range(min=1)),
+        Optional("page", default=1): All(Coerce(int), Range(min=1)),
+        Optional("per-page", default=10): All(Coerce(int), Range(min=1, max=100)),
+    },
+    extra=ALLOW_EXTRA,
+)
+
+
+ExportSchema = Schema(
+    {
+        Optional("format", default="ndjson"): In(("ndjson", "csv")),
+        Optional("start"): Coerce(naive_utc),
+        Optional("end"): Coerce(naive_utc),
+        Optional("room"): All(Coerce(int), Range(min=1)),
+    },
+    extra=REMOVE_EXTRA,
+)
+
+
+ApiListSchema = Schema(
+    {
+        Optional("fields"): str,
+        Optional("cursor"): str,
+        Optional("limit", default=100): All(Coerce(int), Range(min=1, max=1000)),
+        Optional("room"): All(Coerce(int), Range(min=1)),
+        Optional("unit"): str,
+        Optional("lang"): str,
+    },
+    extra=REMOVE_EXTRA,
+)
@@ -0,0 +1,103 @@
+__doc__ = """
+JSON serialization of models straight from column tuples (``/api/...``).
+
+Serializers select only the requested columns and turn every row into a dict
+with a single ``zip``, no model instances are created. Only date and time
+columns are converted (ujson can't encode them), and a whole page is encoded
+with one ``dumps`` call.
+"""
+
+import typing
+from sqlalchemy import Date, DateTime, select
+from ujson import dumps
+from .helper import encode_cursor, decode_cursor
+
+
+class TupleSerializer:
+    """Serializes ``fields`` of model from tuple rows, paginated by id
+
+    Args:
+        model: gino model with an integer ``id`` primary key
+        fields (typing.Sequence[str]): columns clients may select (and get by
+            default)
+        where (typing.Optional[typing.Callable], optional): returns a clause
+            every row has to match (e.g. only public rows). Defaults to None.
+    """
+
+    def __init__(
+        self,
+        model,
+        fields: typing.Sequence[str],
+        where: typing.Optional[typing.Callable] = None,
+    ):
+        self.model, self.fields, self.where = model, tuple(fields), where
+        self.columns = {name: model.__table__.c[name] for name in self.fields}
+        self.temporal = {
+            name
+            for name, column in self.columns.items()
+            if isinstance(column.type, (Date, DateTime))
+        }
+
+    def parse_fields(self, value: typing.Optional[str]) -> tuple:
+        """Parses the ``fields`` query parameter (comma separated)
+
+        Raises:
+            ValueError: if an unknown field is requested
+
+        Returns:
+            tuple: selected fields in the requested order (all if value is empty)
+        """
+        if not value:
+            return self.fields
+        fields = tuple(dict.fromkeys(field.strip() for field in value.split(",")))
+        unknown = [field for field in fields if field not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return fields
+
+    def query(self, fields: tuple, cursor: typing.Optional[str], limit: int):
+        """Constructs Query for one page (limit + 1 rows) after cursor
+
+        The id is appended to the selected columns if it wasn't requested, so
+        every row is ``fields`` followed by (maybe) the id.
+
+        Raises:
+            ValueError: if cursor is malformed
+        """
+        id = self.model.__table__.c.id
+        columns = [self.columns[field] for field in fields]
+        if "id" not in fields:
+            columns.append(id)
+        query = select(columns)
+        if self.where is not None:
+            query = query.where(self.where())
+        if cursor is not None:
+            (after,) = decode_cursor(cursor, 1, (int,))
+            query = query.where(id > after)
+        return query.order_by(id).limit(limit + 1)
+
+    def items(self, rows: typing.Sequence, fields: tuple) -> list:
+        """Rows as list of dicts (extra trailing values are dropped by zip)"""
+        temporal = [field for field in fields if field in self.temporal]
+        if not temporal:
+            return [dict(zip(fields, row)) for row in rows]
+        items = []
+        for row in rows:
+            item = dict(zip(fields, row))
+            for field in temporal:
+                value = item[field]
+                if value is not None:
+                    item[field] = value.isoformat()
+            items.append(item)
+        return items
+
+    def page(self, rows: typing.Sequence, fields: tuple, limit: int) -> str:
+        """Encodes a page fetched with :meth:`query` as ``{items, next}``"""
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(
+                last[fields.index("id")] if "id" in fields else last[len(fields)]
+            )
+        return dumps(dict(items=self.items(rows, fields), next=next_cursor))
@@ -0,0 +1,148 @@
+__doc__ = """
+Opt-in slow query log with EXPLAIN capture.
+
+With ``SLOW_QUERY_MS`` set every query slower than the threshold is logged as
+a JSON line to the ``basho.slow_query`` logger, together with the route that
+issued it and its (redacted) parameters. With ``SLOW_QUERY_EXPLAIN=1`` the
+statement is additionally run through ``EXPLAIN (ANALYZE, BUFFERS)`` in the
+background, at most once per ``SLOW_QUERY_EXPLAIN_INTERVAL`` seconds per
+statement and one at a time. EXPLAIN runs in a transaction that is rolled
+back, so writes issued by traced statements are never applied twice.
+"""
+
+import asyncio
+import typing
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import count
+from logging import getLogger
+from time import monotonic
+from uuid import UUID
+from ujson import dumps, loads
+from quart import Quart, has_request_context, request
+from .gino_quart import GinoConnection
+
+logger = getLogger("basho.slow_query")
+
+# Values of these types are logged as is, everything else (strings, bytes, ...)
+# may hold user data or secrets and is replaced by its type and size
+LOGGED_TYPES = (bool, int, float, Decimal, date, datetime, time, timedelta, UUID)
+
+
+def redact(value) -> typing.Any:
+    if value is None or isinstance(value, LOGGED_TYPES):
+        return value if isinstance(value, (bool, int, float)) else str(value)
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+class SlowQueryLog:
+    def __init__(self, app: Quart, db):
+        self.app, self.db = app, db
+        self.threshold = app.config.get("SLOW_QUERY_MS", None)
+        self.explain = app.config.get("SLOW_QUERY_EXPLAIN", False)
+        self.interval = float(app.config.get("SLOW_QUERY_EXPLAIN_INTERVAL", 60))
+        self.timeout = int(app.config.get("SLOW_QUERY_EXPLAIN_TIMEOUT", 5000))
+        self.explained, self.explaining, self.ids = dict(), None, count(1)
+
+        if self.threshold:
+            self.threshold = float(self.threshold) / 1000
+            GinoConnection.observers.append(self.observe)
+
+            @app.after_serving
+            async def cancel_explain():
+                if self.explaining is not None:
+                    self.explaining.cancel()
+
+    def statement(self, connection, clause, multiparams, params) -> tuple:
+        """Compiles clause the way gino does, without executing it"""
+        context = connection._execute(clause, multiparams, params).context
+        return context.statement, list(context.parameters[0])
+
+    def observe(self, connection, clause, multiparams, params, duration, rows):
+        if duration < self.threshold:
+            return
+        # Called after the query succeeded, logging must never fail it
+        try:
+            self.log(connection, clause, multiparams, params, duration, rows)
+        except Exception:
+            logger.exception("Logging slow query failed")
+
+    def log(self, connection, clause, multiparams, params, duration, rows):
+        statement, args = self.statement(connection, clause, multiparams, params)
+        entry = dict(
+            event="slow_query",
+            id=next(self.ids),
+            duration_ms=round(duration * 1000, 3),
+            rows=rows,
+            query=getattr(clause, "metrics_name", None),
+            sql=statement,
+            params=redact(args),
+        )
+        if has_request_context():
+            entry.update(
+                route=request.endpoint, method=request.method, path=request.path
+            )
+        logger.warning(dumps(entry))
+
+        if self.explain and self.should_explain(statement):
+            self.explaining = asyncio.ensure_future(
+                self.capture_plan(entry["id"], statement, args)
+            )
+
+    def should_explain(self, statement: str) -> bool:
+        """Rate limit, one EXPLAIN at a time and per statement and interval"""
+        if self.explaining is not None and not self.explaining.done():
+            return False
+        now = monotonic()
+        if len(self.explained) > 1024:
+            self.explained = {
+                sql: at
+                for sql, at in self.explained.items()
+                if at > now - self.interval
+            }
+        if self.explained.get(statement, 0) > now - self.interval:
+            return False
+        self.explained[statement] = now
+        return True
+
+    async def capture_plan(self, entry_id: int, statement: str, args: list):
+        started = monotonic()
+        try:
+            # Raw connection, EXPLAIN itself must not be traced
+            async with self.db.acquire() as conn:
+                raw = conn.raw_connection
+                async with raw.transaction():
+                    await raw.execute(f"SET LOCAL statement_timeout = {self.timeout}")
+                    # Keeps parameters as $n in the plan instead of inlining
+                    # them (postgres >= 12)
+                    await raw.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+                    plan = await raw.fetchval(
+                        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", *args
+                    )
+                    raise Rollback(plan)
+        except Rollback as rollback:
+            logger.warning(
+                dumps(
+                    dict(
+                        event="slow_query_plan",
+                        id=entry_id,
+                        explain_ms=round((monotonic() - started) * 1000, 3),
+                        plan=loads(rollback.plan),
+                    )
+                )
+            )
+        except Exception as e:
+            logger.warning(
+                dumps(dict(event="slow_query_plan_failed", id=entry_id, error=repr(e)))
+            )
+
+
+class Rollback(Exception):
+    """Raised to roll back the EXPLAIN ANALYZE transaction"""
+
+    def __init__(self, plan):
+        self.plan = plan
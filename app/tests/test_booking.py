@@ -0,0 +1,31 @@
+from datetime import datetime
+
+
+def test_room_interval_index():
+    from ..booking import RoomIntervalIndex
+
+    index = RoomIntervalIndex(datetime(2020, 1, 1))
+    index.add(2, datetime(2020, 1, 1, 12), datetime(2020, 1, 1, 14))
+    index.add(1, datetime(2020, 1, 1, 8), datetime(2020, 1, 1, 10))
+
+    assert index.ids == [1, 2]
+    assert index.conflict(datetime(2020, 1, 1, 10), datetime(2020, 1, 1, 12)) is None
+    assert index.conflict(datetime(2020, 1, 1, 9), datetime(2020, 1, 1, 11)) == 0
+    assert index.conflict(datetime(2020, 1, 1, 11), datetime(2020, 1, 1, 13)) == 1
+    assert index.conflict(datetime(2020, 1, 1, 7), datetime(2020, 1, 1, 15)) == 1
+
+    index.discard(2)
+    assert index.conflict(datetime(2020, 1, 1, 11), datetime(2020, 1, 1, 13)) is None
+
+
+def test_room_interval_index_add_is_idempotent():
+    from ..booking import RoomIntervalIndex
+
+    index = RoomIntervalIndex(datetime(2020, 1, 1))
+    index.add(1, datetime(2020, 1, 1, 8), datetime(2020, 1, 1, 10))
+    # e.g. a conflict reported by the database for a cached reservation
+    index.add(1, datetime(2020, 1, 1, 8), datetime(2020, 1, 1, 10))
+    assert len(index) == 1
+
+    index.discard(1)
+    assert index.conflict(datetime(2020, 1, 1, 9), datetime(2020, 1, 1, 11)) is None
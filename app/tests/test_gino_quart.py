@@ -0,0 +1,63 @@
+class Connection:
+    async def status(self, clause, *multiparams, **params):
+        return "DELETE 1", []
+
+
+class Acquire:
+    async def __aenter__(self):
+        return Connection()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def engine_cls():
+    from ..gino_quart import GinoEngine
+
+    class Engine(GinoEngine):
+        current_connection = None
+
+        def __init__(self, replicas=()):
+            self.replicas = replicas
+
+        def acquire(self, **kwargs):
+            return Acquire()
+
+    return Engine
+
+
+def test_delete_pins_request_to_primary():
+    import asyncio
+    from sqlalchemy import column, select, table
+    from ..gino_quart import _routing
+
+    Engine = engine_cls()
+    replica = Engine()
+    primary = Engine(replicas=(replica,))
+    rooms = table("rooms", column("id"))
+
+    async def request():
+        _routing.set(dict(read_only=True, primary=False, wrote=False, replica=None))
+        assert primary.route(select([rooms.c.id])) is replica
+        await primary.status(rooms.delete().where(rooms.c.id == 1))
+        assert _routing.get()["wrote"]
+        assert primary.route(select([rooms.c.id])) is primary
+
+    asyncio.run(request())
+
+
+def test_request_reads_from_one_replica():
+    import asyncio
+    from sqlalchemy import column, select, table
+    from ..gino_quart import _routing
+
+    Engine = engine_cls()
+    primary = Engine(replicas=(Engine(), Engine()))
+    query = select([table("rooms", column("id")).c.id])
+
+    async def request():
+        _routing.set(dict(read_only=True, primary=False, wrote=False, replica=None))
+        return {primary.route(query) for _ in range(4)}
+
+    replicas = asyncio.run(request())
+    assert len(replicas) == 1 and replicas <= set(primary.replicas)
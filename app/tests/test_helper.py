@@ -0,0 +1,66 @@
+import pytest
+
+
+def test_cursor_roundtrip():
+    from ..helper import encode_cursor, decode_cursor
+
+    cursor = encode_cursor("Raum 1", 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == ["Raum 1", 42]
+
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 3)
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor", 2)
+
+
+def test_cursor_types():
+    from ..helper import encode_cursor, decode_cursor
+
+    assert decode_cursor(encode_cursor("Raum 1", 42), 2, (str, int)) == ["Raum 1", 42]
+    for values in ((1, 42), ("Raum 1", "42"), ("Raum 1", True), ("Raum 1", 2**31)):
+        with pytest.raises(ValueError):
+            decode_cursor(encode_cursor(*values), 2, (str, int))
+
+
+def test_listener_logs_failed_handlers():
+    import asyncio
+    from unittest.mock import MagicMock
+    from ..helper import Listener
+
+    app = MagicMock()
+    app.config = dict()
+    listener = Listener(app)
+
+    async def fail(payload: str):
+        raise RuntimeError(payload)
+
+    listener.subscribe("units", fail)
+
+    async def notify():
+        listener.notify(None, 1, "units", "boom")
+        assert len(listener.tasks) == 1
+        await asyncio.gather(*listener.tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(notify())
+    assert listener.tasks == set()
+    app.logger.error.assert_called_once()
+
+
+def test_role_cache_listens_on_shared_listener():
+    import asyncio
+    from unittest.mock import MagicMock
+    from ..helper import Listener, RoleCache
+
+    app = MagicMock()
+    app.config = dict()
+    listener, roles = Listener(app), RoleCache(app)
+    roles.entries.update({1: (0, ["admin"]), 2: (0, ["user"])})
+    roles.listen(listener)
+
+    listener.notify(None, 1, RoleCache.channel, "1")
+    assert list(roles.entries) == [2]
+    on_reconnect = listener.channels[RoleCache.channel][1]
+    asyncio.run(on_reconnect())
+    assert not roles.entries
@@ -0,0 +1,23 @@
+def test_percentile():
+    from ..loadtest import percentile
+
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.95) == 0.0
+
+
+def test_compare_flags_regressions():
+    from ..loadtest import compare
+
+    def run(rps: float, p95: float, error_rate: float) -> dict:
+        result = dict(rps=rps, p50=1.0, p95=p95, p99=10.0, error_rate=error_rate)
+        return dict(scenarios=dict(index=result))
+
+    assert compare(run(100, 5, 0), run(95, 5.2, 0), 10) == []
+    regressions = compare(run(100, 5, 0), run(80, 6, 0.15), 10)
+    assert {(r["metric"], r["change"]) for r in regressions} == {
+        ("rps", 20.0),
+        ("p95", 20.0),
+        ("error_rate", 15.0),
+    }
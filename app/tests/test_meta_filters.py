@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+
+def compile(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_parse_meta_filters():
+    from quart.exceptions import BadRequest
+    from ..routes import parse_meta_filters
+
+    contains, ranges = parse_meta_filters(
+        {
+            "meta-floor": "2",
+            "meta-wing": '"2"',
+            "meta-projector": "true",
+            "meta-building": "north",
+            "min-capacity": "4",
+            "max-capacity": "12.5",
+        }
+    )
+    # JSON scalars keep their type, anything else is a string
+    assert contains == dict(floor=2, wing="2", projector=True, building="north")
+    assert ranges == dict(capacity=(4.0, 12.5))
+    assert parse_meta_filters({"max-capacity": "8"})[1] == dict(capacity=(None, 8.0))
+
+    for args in (
+        {"min-floor": "1"},
+        {"min-capacity": "many"},
+        {"min-capacity": "nan"},
+        {"max-capacity": "inf"},
+    ):
+        with pytest.raises(BadRequest):
+            parse_meta_filters(args)
+
+
+def test_filter_by_meta():
+    from ..models import Room
+
+    sql = compile(
+        Room.filter_by_meta(
+            contains=dict(projector=True), ranges=dict(capacity=(4, 12))
+        )
+    )
+    assert "rooms.meta @> " in sql
+    # Same expression as ix_rooms_meta_capacity, (meta -> 'capacity')
+    assert "jsonb_typeof(rooms.meta -> 'capacity')" in sql
+    assert sql.count("rooms.meta -> 'capacity'") == 3
+    assert ">= to_jsonb(CAST(" in sql and "<= to_jsonb(CAST(" in sql
+
+    index = next(
+        index
+        for index in Room.__table__.indexes
+        if index.name == "ix_rooms_meta_capacity"
+    )
+    assert "(meta -> 'capacity')" in str(index.expressions[0])
+
+    with pytest.raises(ValueError):
+        Room.filter_by_meta(ranges=dict(floor=(1, None)))
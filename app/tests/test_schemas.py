@@ -0,0 +1,19 @@
+from datetime import datetime
+
+
+def test_naive_utc():
+    from ..schemas import naive_utc
+
+    assert naive_utc("2020-08-01T10:30") == datetime(2020, 8, 1, 10, 30)
+    assert naive_utc("2020-08-01T10:30+02:00") == datetime(2020, 8, 1, 8, 30)
+
+
+def test_availability_schema_normalizes_time_zones():
+    from ..schemas import AvailabilitySchema
+
+    args = AvailabilitySchema(
+        dict(start="2020-08-01T10:00+02:00", end="2020-08-01T12:00")
+    )
+    assert args["start"] == datetime(2020, 8, 1, 8)
+    assert args["start"].tzinfo is None
+    assert args["end"] == datetime(2020, 8, 1, 12)
@@ -0,0 +1,55 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table
+from ujson import loads
+
+
+class Model:
+    __table__ = Table(
+        "things",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("name", String),
+        Column("start", DateTime),
+    )
+
+
+def test_fields():
+    from ..serializers import TupleSerializer
+
+    serializer = TupleSerializer(Model, ("id", "name", "start"))
+    assert serializer.parse_fields(None) == ("id", "name", "start")
+    assert serializer.parse_fields("start, name,start") == ("start", "name")
+    with pytest.raises(ValueError):
+        serializer.parse_fields("name,secret")
+
+
+def test_page():
+    from ..helper import decode_cursor
+    from ..serializers import TupleSerializer
+
+    serializer = TupleSerializer(Model, ("id", "name", "start"))
+    start = datetime(2020, 8, 1, 10, 30)
+    # Rows of a query for ("start", "name") with the id appended, limit 2
+    rows = [(start, "a", 1), (None, "b", 2), (start, "c", 3)]
+    page = loads(serializer.page(rows, ("start", "name"), 2))
+    assert page["items"] == [
+        dict(start="2020-08-01T10:30:00", name="a"),
+        dict(start=None, name="b"),
+    ]
+    assert decode_cursor(page["next"], 1) == [2]
+
+    page = loads(serializer.page([("a", 1)], ("name", "id"), 2))
+    assert page == dict(items=[dict(name="a", id=1)], next=None)
+
+
+def test_query():
+    from ..helper import encode_cursor
+    from ..serializers import TupleSerializer
+
+    serializer = TupleSerializer(Model, ("id", "name"))
+    query = serializer.query(("name",), encode_cursor(5), 10)
+    assert [column.name for column in query.columns] == ["name", "id"]
+    assert "things.id >" in str(query)
+    with pytest.raises(ValueError):
+        serializer.query(("name",), encode_cursor("5"), 10)
@@ -7,6 +7,7 @@ __version__ = "0.0.1"
 import click
 import asyncio
 from functools import wraps
+from urllib.parse import urlsplit
 from app.helper import connect
 
 
@@ -88,7 +89,13 @@ def devserver(port, reload, host, http, loop, workers, log_level):
     Options: https://www.uvicorn.org/#running-programmatically#command-line-options
     """
     from uvicorn import run
+    from os import environ
 
+    # uvicorn runs a single process with reload
+    if reload:
+        workers = 1
+    # Lets every worker size its database pool (see DB_CONNECTION_BUDGET)
+    environ["WEB_CONCURRENCY"] = str(workers)
     run(
         "app:app",
         http=http,
@@ -101,37 +108,56 @@ def devserver(port, reload, host, http, loop, workers, log_level):
     )
 
 
+@toolkit.command()
+@click.option("--static", default="app/static", type=click.Path(exists=True))
+def build_assets(static):
+    """Write content hashed, precompressed static files and their manifest"""
+    from app.assets import build_assets, brotli
+    from os import path
+
+    if brotli is None:
+        click.echo("brotli is not installed, only .gz variants are written")
+    manifest = build_assets(static)
+    click.echo(
+        f"{len(manifest)} assets written to {path.join(static, 'build')}/ "
+        "(restart the app to pick up the manifest)"
+    )
+
+
+@toolkit.command()
+def compile_templates():
+    """Compile all templates into the shared jinja bytecode cache"""
+    from app import app
+    from app.helper import warm_templates
+
+    count = warm_templates(app)
+    directory = app.jinja_env.bytecode_cache.directory
+    click.echo(f"{count} templates compiled into {directory}")
+
+
 @toolkit.command()
 @click.option("--force", is_flag=True, default=False, type=bool)
 @click.option("--purge", is_flag=True, default=False, type=bool)
 @coro
 async def initial_setup(force: bool, purge: bool):
+    """Seed translation units from default-units.json (idempotent)"""
+    from app import db
     from app.models import TranslationUnits
     from json import load
+    from time import perf_counter
 
     with open("default-units.json", "r") as file:
         units = load(file)
 
     await connect()
 
-    if purge:
-        _units = await TranslationUnits.query.gino.all()
-        for unit in _units:
-            await unit.delete()
-
-    langs = units.keys()
-    for lang in langs:
-        for unit, items in units[lang].items():
-            trans = await TranslationUnits.get_unit(lang=lang, unit=unit)
-            if trans is not None and force:
-                await trans.update(
-                    unit=unit, default=items["default"], label=items["label"]
-                ).apply()
-
-            else:
-                await TranslationUnits.create(
-                    lang=lang, unit=unit, default=items["default"], label=items["label"]
-                )
+    started = perf_counter()
+    async with db.transaction():
+        if purge:
+            status, _ = await TranslationUnits.delete.gino.status()
+            click.echo(f"Purged {status.split()[-1]} units")
+        count = await TranslationUnits.seed(units, force=force)
+    click.echo(f"Seeded {count} units in {(perf_counter() - started) * 1000:.1f} ms")
 
 
 @toolkit.command()
@@ -172,5 +198,369 @@ async def adduser(name, email, password, issuperuser):
     return
 
 
+@toolkit.command()
+@click.option("--users", type=int, default=10000, show_default=True)
+@click.option("--roles", type=int, default=50, show_default=True)
+@click.option("--rooms", type=int, default=500, show_default=True)
+@click.option("--reservations", type=int, default=200000, show_default=True)
+@click.option("--weeks", type=int, default=26, show_default=True)
+@click.option(
+    "--start",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    default=None,
+    help="First day of reservations [default: weeks/2 before this monday]",
+)
+@click.option("--seed", type=int, default=0, show_default=True)
+@coro
+async def generate_data(
+    users: int,
+    roles: int,
+    rooms: int,
+    reservations: int,
+    weeks: int,
+    start,
+    seed: int,
+):
+    """Bulk load deterministic synthetic users, roles, rooms and reservations
+
+    Rows are appended (ids continue after the current maximum) with COPY.
+    All generated users share the password "password".
+    """
+    from app import db
+    from app.models import User
+    from app import datagen
+    from datetime import date, timedelta
+    from random import Random
+    from time import perf_counter
+
+    if start is None:
+        today = date.today()
+        start = today - timedelta(days=today.weekday(), weeks=weeks // 2)
+    else:
+        start = start.date()
+    rng = Random(seed)
+
+    await connect()
+    async with db.acquire() as conn:
+        raw = conn.raw_connection
+
+        async def next_id(table: str) -> int:
+            return await raw.fetchval(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")
+
+        async def copy(table: str, columns: tuple, rows) -> int:
+            started, count = perf_counter(), 0
+            for batch in datagen.batches(rows):
+                await raw.copy_records_to_table(table, records=batch, columns=columns)
+                count += len(batch)
+            click.echo(
+                f"{table:>14}: {count:9d} rows in {perf_counter() - started:7.1f} s"
+            )
+            return count
+
+        async with raw.transaction():
+            first = await next_id("users")
+            user_ids = range(first, first + users)
+            await copy(
+                "users",
+                (
+                    "id",
+                    "username",
+                    "e_mail",
+                    "gravatar",
+                    "password",
+                    "is_superuser",
+                    "is_suspended",
+                ),
+                datagen.users(
+                    rng, user_ids.start, users, User.gen_password("password")
+                ),
+            )
+            first = await next_id("roles")
+            role_ids = range(first, first + roles)
+            await copy("roles", ("id", "name"), datagen.roles(role_ids.start, roles))
+            await copy(
+                "userroles",
+                ("id", "user_id", "role_id"),
+                datagen.user_roles(rng, user_ids, role_ids, await next_id("userroles")),
+            )
+            first = await next_id("rooms")
+            room_ids = range(first, first + rooms)
+            await copy(
+                "rooms",
+                ("id", "nick", "description", "meta", "master_id"),
+                datagen.rooms(rng, room_ids.start, rooms, user_ids),
+            )
+            await copy(
+                "reservations",
+                ("id", "room_id", "user_id", "is_public", "start", "end"),
+                datagen.reservations(
+                    seed,
+                    rng,
+                    room_ids,
+                    user_ids,
+                    reservations,
+                    start,
+                    weeks,
+                    await next_id("reservations"),
+                ),
+            )
+            for table in ("users", "roles", "userroles", "rooms", "reservations"):
+                await raw.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT max(id) FROM {table}))"
+                )
+        # Fresh statistics, so EXPLAIN plans reflect the new table sizes
+        await raw.execute("ANALYZE users, roles, userroles, rooms, reservations")
+
+
+@toolkit.command()
+@click.option(
+    "--url",
+    default=None,
+    help="Benchmark a running server instead of the app in-process",
+)
+@click.option(
+    "--uvicorn",
+    "uvicorn_workers",
+    type=int,
+    default=0,
+    help="Start uvicorn with this many workers and benchmark it",
+)
+@click.option("--scenario", "scenarios", multiple=True, help="[default: all]")
+@click.option("--concurrency", type=int, default=32, show_default=True)
+@click.option("--duration", type=float, default=10, show_default=True)
+@click.option("--warmup", type=float, default=2, show_default=True)
+@click.option("--password", default="password", show_default=True)
+@click.option("-o", "--output", type=click.Path(), default=None)
+@coro
+async def benchmark_http(
+    url, uvicorn_workers, scenarios, concurrency, duration, warmup, password, output
+):
+    """Load test routes and report throughput and latency percentiles
+
+    Seed the database first (generate-data), results are comparable between
+    runs against the same data set only.
+    """
+    from app import app
+    from app.loadtest import SCENARIOS, InProcessClient, HttpClient
+    from app.loadtest import sample, run_scenario
+    from datetime import datetime
+    from platform import python_version
+    from subprocess import Popen, run, PIPE
+    from os import environ
+    from ujson import dump
+    import sys
+
+    for name in scenarios:
+        if name not in SCENARIOS:
+            raise click.BadParameter(
+                f"choose from {', '.join(SCENARIOS)}", param_hint=name
+            )
+    scenarios = scenarios or tuple(SCENARIOS)
+
+    server = None
+    if uvicorn_workers:
+        url = url or "http://127.0.0.1:8765"
+        port = str(urlsplit(url).port or 80)
+        server = Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", port]
+            + ["--workers", str(uvicorn_workers), "--log-level", "warning"],
+            env=dict(environ, WEB_CONCURRENCY=str(uvicorn_workers)),
+        )
+    if url is None:
+        await app.startup()
+        factory = lambda: InProcessClient(app)
+    else:
+        await connect()
+        factory = lambda: HttpClient(url)
+    try:
+        if server is not None:
+            await wait_for_port(url)
+        samples = await sample(password)
+        commit = run(["git", "rev-parse", "HEAD"], stdout=PIPE, stderr=PIPE)
+        results = dict(
+            meta=dict(
+                time=datetime.now().isoformat(),
+                commit=commit.stdout.decode().strip() or None,
+                python=python_version(),
+                target=url or "in-process",
+                workers=uvicorn_workers or None,
+                concurrency=concurrency,
+                duration=duration,
+                sizes=samples["sizes"],
+            ),
+            scenarios=dict(),
+        )
+        click.echo(
+            f"{'scenario':>10} {'requests':>9} {'errors':>7} {'req/s':>9} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        for name in scenarios:
+            result = await run_scenario(
+                name, factory, samples, concurrency, duration, warmup
+            )
+            results["scenarios"][name] = result
+            click.echo(
+                f"{name:>10} {result['requests']:9d} {result['errors']:7d} "
+                f"{result['rps']:9.1f} {result['p50']:9.2f} {result['p95']:9.2f} "
+                f"{result['p99']:9.2f}"
+            )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        elif url is None:
+            await app.shutdown()
+
+    if output is not None:
+        with open(output, "w") as f:
+            dump(results, f, indent=2)
+        click.echo(f"Results written to {output}")
+
+
+async def wait_for_port(url: str, timeout: float = 30):
+    url = urlsplit(url)
+    deadline = asyncio.get_event_loop().time() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+            writer.close()
+            return
+        except OSError:
+            if asyncio.get_event_loop().time() > deadline:
+                raise click.ClickException(f"Server at {url.geturl()} did not start")
+            await asyncio.sleep(0.2)
+
+
+@toolkit.command()
+@click.argument("baseline", type=click.File("r"))
+@click.argument("candidate", type=click.File("r"))
+@click.option(
+    "--threshold",
+    type=float,
+    default=10,
+    show_default=True,
+    help="Allowed change in percent (percentage points for error rates)",
+)
+def benchmark_compare(baseline, candidate, threshold: float):
+    """Compare two benchmark-http results, exits with 1 on regressions"""
+    from app.loadtest import compare
+    from ujson import load
+
+    baseline, candidate = load(baseline), load(candidate)
+    if baseline["meta"]["sizes"] != candidate["meta"]["sizes"]:
+        click.echo("Warning: runs used different data sizes")
+    regressions = compare(baseline, candidate, threshold)
+    for regression in regressions:
+        click.echo(
+            "{scenario:>10} {metric:>10}: {baseline:10.2f} -> {candidate:10.2f} "
+            "({change:+.1f}%)".format(**regression)
+        )
+    if regressions:
+        raise SystemExit(1)
+    click.echo(f"No regressions above {threshold}%")
+
+
+@toolkit.command()
+@click.option("--logins", type=int, default=200, show_default=True)
+@click.option("--concurrency", type=int, default=50, show_default=True)
+@coro
+async def benchmark_login(logins: int, concurrency: int):
+    """Compare inline and pooled password verification during a login burst
+
+    Measures login throughput (successful verifications only, logins
+    rejected by a saturated pool are reported separately) and the latency of
+    an unrelated coroutine (standing in for other requests) that ticks every
+    millisecond.
+    """
+    from app import app
+    from app.hashing import PoolSaturated
+    from app.models import User
+    from time import perf_counter
+    from statistics import median
+
+    user = User(username="benchmark", password=User.gen_password("benchmark"))
+
+    async def probe(lags: list, done: asyncio.Event):
+        while not done.is_set():
+            started = perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(perf_counter() - started - 0.001)
+
+    async def burst(verify) -> tuple:
+        lags, done, semaphore = [], asyncio.Event(), asyncio.Semaphore(concurrency)
+        rejected = 0
+
+        async def login():
+            nonlocal rejected
+            async with semaphore:
+                try:
+                    await verify("benchmark")
+                except PoolSaturated:
+                    rejected += 1
+
+        ticker = asyncio.ensure_future(probe(lags, done))
+        started = perf_counter()
+        await asyncio.gather(*[login() for _ in range(logins)])
+        elapsed = perf_counter() - started
+        done.set()
+        await ticker
+        lags.sort()
+        return elapsed, lags, rejected
+
+    async def inline(password: str) -> bool:
+        return user.verify_password(password)
+
+    for name, verify in (("inline", inline), ("pooled", user.verify_password_async)):
+        elapsed, lags, rejected = await burst(verify)
+        p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+        click.echo(
+            f"{name:>7}: {(logins - rejected) / elapsed:8.1f} logins/s, "
+            f"{rejected} rejected, "
+            f"probe lag p50 {median(lags or [0]) * 1000:7.2f} ms "
+            f"p99 {p99 * 1000:7.2f} ms"
+        )
+    app.hash_pool.shutdown()
+
+
+@toolkit.command()
+@click.option("--rounds", type=int, default=200, show_default=True)
+def benchmark_tokens(rounds: int):
+    """Compare token verification of User.token and ApiToken (CPU time only)"""
+    from app.models import User, ApiToken
+    from werkzeug.security import generate_password_hash, check_password_hash
+    from secrets import token_urlsafe
+    from hmac import compare_digest
+    from time import perf_counter
+
+    legacy_token = token_urlsafe(64)
+    legacy_hash = generate_password_hash(legacy_token)
+    verifier = token_urlsafe(32)
+    verifier_hash = ApiToken.hash_verifier(verifier)
+    candidates = [
+        (
+            "User.token (pbkdf2)",
+            lambda: check_password_hash(legacy_hash, legacy_token),
+        ),
+        (
+            "ApiToken (hmac)",
+            lambda: compare_digest(verifier_hash, ApiToken.hash_verifier(verifier)),
+        ),
+    ]
+    for name, verify in candidates:
+        started = perf_counter()
+        for _ in range(rounds):
+            assert verify()
+        elapsed = perf_counter() - started
+        click.echo(
+            f"{name:>20}: {elapsed / rounds * 1e6:10.1f} us/verification, "
+            f"{rounds / elapsed:10.1f} verifications/s"
+        )
+    click.echo(
+        "User.token needs the user up front (or one hash per candidate row); "
+        "ApiToken needs one indexed lookup by selector"
+    )
+
+
 if __name__ == "__main__":
     toolkit()